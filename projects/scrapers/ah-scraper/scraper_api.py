@@ -13,15 +13,17 @@ from typing import Optional, Dict, List, Any, Union
 import asyncio
 import json
 import os
-import subprocess
 import time
-import threading
 import uuid
 import logging
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 from pathlib import Path
 
+import aiohttp
+import requests
+import uvicorn
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -35,7 +37,7 @@ logger = logging.getLogger(__name__)
 
 # Global state management
 scraper_jobs: Dict[str, Dict] = {}
-active_processes: Dict[str, subprocess.Popen] = {}
+active_processes: Dict[str, asyncio.subprocess.Process] = {}
 MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "3"))
 
 # Pydantic models for API
@@ -117,8 +119,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def run_scraper_subprocess(job_id: str, config: ScrapingRequest):
-    """Run the original scraper as subprocess with job-specific config"""
+def send_completion_webhook_sync(job_id: str, webhook_url: str):
+    """Send the job completion webhook (blocking; run via asyncio.to_thread)"""
+    try:
+        # Prepare webhook payload
+        payload = {
+            "job_id": job_id,
+            "status": "completed",
+            "scraper": "ah",
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+            "duration_seconds": None,
+            "products_scraped": None,
+            "webhook_sent_at": datetime.now(timezone.utc).isoformat()
+        }
+        
+        # Calculate duration if both timestamps exist
+        job_data = scraper_jobs.get(job_id, {})
+        if job_data.get("started_at"):
+            duration = (datetime.now(timezone.utc) - job_data["started_at"]).total_seconds()
+            payload["duration_seconds"] = duration
+        
+        # Try to get product count from results file
+        try:
+            results_file = f"/app/results/{job_id}_products.json"
+            if os.path.exists(results_file):
+                with open(results_file, 'r') as f:
+                    results = json.load(f)
+                    if isinstance(results, list):
+                        payload["products_scraped"] = len(results)
+                    elif isinstance(results, dict):
+                        payload["products_scraped"] = results.get("total_products", 0)
+        except Exception as e:
+            logger.warning(f"Could not determine product count for job {job_id}: {e}")
+        
+        # Send webhook with timeout
+        response = requests.post(webhook_url, json=payload, timeout=30)
+        if response.status_code == 200:
+            logger.info(f"Webhook notification sent successfully for job {job_id}")
+        else:
+            logger.warning(f"Webhook returned status {response.status_code} for job {job_id}")
+            
+    except Exception as e:
+        logger.error(f"Failed to send webhook notification for job {job_id}: {e}")
+
+async def run_scraper_subprocess(job_id: str, config: ScrapingRequest):
+    """Run the original scraper as an asyncio subprocess with job-specific config"""
     
     try:
         # Create job-specific config file
@@ -147,30 +192,26 @@ def run_scraper_subprocess(job_id: str, config: ScrapingRequest):
         
         logger.info(f"Starting scraper subprocess for job {job_id}")
         
-        # Run the original scraper with job-specific parameters
-        process = subprocess.Popen([
-            "python", "/app/ah_scraper.py", 
-            "--config", config_file_path
-        ], 
-        cwd="/app", 
-        stdout=subprocess.PIPE, 
-        stderr=subprocess.STDOUT, 
-        text=True,
-        bufsize=1,
-        universal_newlines=True
-        )
-        
-        active_processes[job_id] = process
-        
-        # Monitor process output
+        # Run the original scraper with job-specific parameters; its output goes
+        # straight to the job log file descriptor instead of through this process
         log_file_path = f"/app/logs/{job_id}.log"
-        with open(log_file_path, "w") as log_file:
-            for line in process.stdout:
-                log_file.write(line)
-                log_file.flush()
+        with open(log_file_path, "wb") as log_file:
+            process = await asyncio.create_subprocess_exec(
+                "python", "/app/ah_scraper.py",
+                "--config", config_file_path,
+                cwd="/app",
+                stdout=log_file,
+                stderr=asyncio.subprocess.STDOUT
+            )
+            
+            active_processes[job_id] = process
+            
+            # Wait for completion without holding a worker thread
+            return_code = await process.wait()
         
-        # Wait for completion
-        return_code = process.wait()
+        if scraper_jobs[job_id].get("status") == "cancelled":
+            # cancel_job already recorded the outcome
+            return
         
         if return_code == 0:
             # Success
@@ -184,49 +225,7 @@ def run_scraper_subprocess(job_id: str, config: ScrapingRequest):
             
             # Send webhook notification if configured
             if config.webhook_url and config.notify_on_complete:
-                try:
-                    # Use requests for synchronous webhook call from subprocess
-                    import requests
-                    
-                    # Prepare webhook payload
-                    payload = {
-                        "job_id": job_id,
-                        "status": "completed",
-                        "scraper": "ah",
-                        "completed_at": datetime.now(timezone.utc).isoformat(),
-                        "duration_seconds": None,
-                        "products_scraped": None,
-                        "webhook_sent_at": datetime.now(timezone.utc).isoformat()
-                    }
-                    
-                    # Calculate duration if both timestamps exist
-                    job_data = scraper_jobs.get(job_id, {})
-                    if job_data.get("started_at"):
-                        duration = (datetime.now(timezone.utc) - job_data["started_at"]).total_seconds()
-                        payload["duration_seconds"] = duration
-                    
-                    # Try to get product count from results file
-                    try:
-                        results_file = f"/app/results/{job_id}_products.json"
-                        if os.path.exists(results_file):
-                            with open(results_file, 'r') as f:
-                                results = json.load(f)
-                                if isinstance(results, list):
-                                    payload["products_scraped"] = len(results)
-                                elif isinstance(results, dict):
-                                    payload["products_scraped"] = results.get("total_products", 0)
-                    except Exception as e:
-                        logger.warning(f"Could not determine product count for job {job_id}: {e}")
-                    
-                    # Send webhook with timeout
-                    response = requests.post(config.webhook_url, json=payload, timeout=30)
-                    if response.status_code == 200:
-                        logger.info(f"Webhook notification sent successfully for job {job_id}")
-                    else:
-                        logger.warning(f"Webhook returned status {response.status_code} for job {job_id}")
-                        
-                except Exception as e:
-                    logger.error(f"Failed to send webhook notification for job {job_id}: {e}")
+                await asyncio.to_thread(send_completion_webhook_sync, job_id, config.webhook_url)
                 
         else:
             # Failure
@@ -249,14 +248,11 @@ def run_scraper_subprocess(job_id: str, config: ScrapingRequest):
     
     finally:
         # Clean up
-        if job_id in active_processes:
-            del active_processes[job_id]
+        active_processes.pop(job_id, None)
         logger.info(f"Cleaned up job {job_id}")
 
 async def send_webhook_notification(job_id: str, webhook_url: str):
     """Send completion notification to webhook"""
-    import aiohttp
-    
     try:
         job_data = scraper_jobs.get(job_id, {})
         payload = {
@@ -498,17 +494,21 @@ async def cancel_job(job_id: str):
             detail=f"Cannot cancel job {job_id} with status: {job['status']}"
         )
     
+    # Mark cancelled before terminating, so run_scraper_subprocess (which resumes
+    # from process.wait() first) sees it and does not record the job as failed
+    scraper_jobs[job_id]["status"] = "cancelled"
+    
     # Terminate the process if running
-    if job_id in active_processes:
+    process = active_processes.get(job_id)
+    if process is not None:
         try:
-            process = active_processes[job_id]
             process.terminate()
             # Give it a moment to terminate gracefully
             try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
+                await asyncio.wait_for(process.wait(), timeout=5)
+            except asyncio.TimeoutError:
                 process.kill()  # Force kill if it doesn't terminate
-            del active_processes[job_id]
+            active_processes.pop(job_id, None)
             logger.info(f"Terminated process for job {job_id}")
         except Exception as e:
             logger.error(f"Error terminating job {job_id}: {e}")
@@ -660,7 +660,6 @@ async def websocket_job_progress(websocket, job_id: str):
         await websocket.close()
 
 if __name__ == "__main__":
-    import uvicorn
     uvicorn.run(
         "scraper_api:app",
         host="0.0.0.0",
@@ -6,35 +6,25 @@ Provides configuration management for the AH scraper service
 
 import os
 import json
+from functools import lru_cache
 from pathlib import Path
 
+@lru_cache(maxsize=None)
 def get_output_directory():
     """Get the configured output directory for scraper results"""
     # For container deployment, use standard paths
-    output_dir = os.getenv("OUTPUT_DIR", "/app/results")
-    
-    # Ensure directory exists
-    os.makedirs(output_dir, exist_ok=True)
-    
-    return output_dir
+    # Directories are created once at startup by ensure_directories()
+    return os.getenv("OUTPUT_DIR", "/app/results")
 
+@lru_cache(maxsize=None)
 def get_jobs_directory():
     """Get the directory for job files"""
-    jobs_dir = os.getenv("JOBS_DIR", "/app/jobs")
-    
-    # Ensure directory exists
-    os.makedirs(jobs_dir, exist_ok=True)
-    
-    return jobs_dir
+    return os.getenv("JOBS_DIR", "/app/jobs")
 
+@lru_cache(maxsize=None)
 def get_logs_directory():
     """Get the directory for log files"""
-    logs_dir = os.getenv("LOGS_DIR", "/app/logs")
-    
-    # Ensure directory exists
-    os.makedirs(logs_dir, exist_ok=True)
-    
-    return logs_dir
+    return os.getenv("LOGS_DIR", "/app/logs")
 
 def load_scraper_config(config_file_path=None):
     """Load scraper configuration from file or environment"""
@@ -144,12 +134,13 @@ def get_data_paths(job_id=None):
     
     return base_paths
 
-def ensure_directories():
-    """Ensure all required directories exist"""
+def ensure_directories(*extra_directories):
+    """Ensure all required directories exist (call once at startup)"""
     directories = [
         get_output_directory(),
         get_jobs_directory(),
-        get_logs_directory()
+        get_logs_directory(),
+        *extra_directories
     ]
     
     for directory in directories:
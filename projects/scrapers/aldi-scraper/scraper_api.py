@@ -10,25 +10,39 @@ import asyncio
 import json
 import os
 import logging
+import logging.handlers
+import queue
 import subprocess
 import sys
 import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 import signal
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 import requests
 from contextlib import asynccontextmanager
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # Progress monitoring imports
 sys.path.append('/app')
 try:
     from progress_monitor import update_status, update_progress, ScraperStatus, get_amsterdam_time
-    from config_utils import get_output_directory
+    from config_utils import get_output_directory, ensure_directories
 except ImportError:
     # Fallback implementations for container deployment
     class ScraperStatus:
@@ -49,16 +63,27 @@ except ImportError:
     
     def get_output_directory():
         return "/app/results"
+    
+    def ensure_directories(*extra_directories):
+        for directory in ("/app/results", "/app/jobs", "/app/logs", *extra_directories):
+            os.makedirs(directory, exist_ok=True)
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("/app/logs/api.log", mode='a'),
-        logging.StreamHandler()
-    ]
+# Setup logging: handlers only enqueue records, a background listener thread does the writes
+log_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+log_file_handler = logging.FileHandler("/app/logs/api.log", mode='a')
+log_file_handler.setFormatter(log_formatter)
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(log_formatter)
+
+log_queue: queue.Queue = queue.Queue(-1)
+log_listener = logging.handlers.QueueListener(
+    log_queue, log_file_handler, log_stream_handler, respect_handler_level=True
 )
+log_listener.start()
+
+log_queue_handler = logging.handlers.QueueHandler(log_queue)
+log_queue_handler.setFormatter(logging.Formatter("%(message)s"))  # full format is applied by the listener's handlers
+logging.basicConfig(level=logging.INFO, handlers=[log_queue_handler])
 logger = logging.getLogger("scraper_api")
 
 # Startup/shutdown event handlers
@@ -67,15 +92,15 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Starting Aldi Scraper API Service...")
     
-    # Create necessary directories
-    os.makedirs("/app/jobs", exist_ok=True)
-    os.makedirs("/app/results", exist_ok=True)
-    os.makedirs("/app/logs", exist_ok=True)
-    os.makedirs("/app/shared-data", exist_ok=True)
+    # Create necessary directories once; path getters are pure lookups afterwards
+    ensure_directories("/app/shared-data")
     
     # Record startup time
     app.state.startup_time = time.time()
     
+    # Guards multi-step mutations of active_jobs/completed_jobs/job_processes
+    app.state.jobs_lock = asyncio.Lock()
+    
     update_status('aldi', ScraperStatus.STARTING, "API service initializing...")
     logger.info("✅ Aldi Scraper API Service started successfully")
     yield
@@ -83,19 +108,26 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("🛑 Shutting down scraper service...")
     
-    # Terminate any running jobs
-    for job_id, process in job_processes.items():
-        if process and process.poll() is None:
-            logger.info(f"Terminating job {job_id}")
-            try:
-                process.terminate()
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                process.kill()
-            except Exception as e:
-                logger.error(f"Error terminating job {job_id}: {e}")
+    # Terminate any running jobs (snapshot first so cleanup can't mutate the dict mid-iteration)
+    async with app.state.jobs_lock:
+        running_processes = list(job_processes.items())
+    
+    async def terminate_job(job_id, process):
+        logger.info(f"Terminating job {job_id}")
+        try:
+            await asyncio.to_thread(terminate_process_group, process, 5)
+        except Exception as e:
+            logger.error(f"Error terminating job {job_id}: {e}")
+    
+    # In worker threads and concurrently, so shutdown waits at most one grace period overall
+    await asyncio.gather(*(
+        terminate_job(job_id, process)
+        for job_id, process in running_processes
+        if process and process.poll() is None
+    ))
     
     logger.info("✅ Shutdown complete")
+    log_listener.stop()
 
 # Create FastAPI app
 app = FastAPI(
@@ -109,12 +141,53 @@ app = FastAPI(
 
 # Configuration
 MAX_CONCURRENT_JOBS = int(os.getenv('MAX_CONCURRENT_JOBS', '3'))
+MAX_COMPLETED_JOBS = int(os.getenv('MAX_COMPLETED_JOBS', '1000'))
+MAX_ERROR_BYTES = 8 * 1024  # Keep only the tail of stderr for failed jobs
+ZSTD_LEVEL = 3
 
 # Global variables for job management
 active_jobs: Dict[str, Dict] = {}
-completed_jobs: Dict[str, Dict] = {}
+completed_jobs: OrderedDict[str, Dict] = OrderedDict()
 job_processes: Dict[str, subprocess.Popen] = {}
 
+def _record_completed(job_id: str, job_data: Dict) -> None:
+    """Store a finished job, evicting the oldest entries beyond MAX_COMPLETED_JOBS (call under jobs_lock)"""
+    completed_jobs[job_id] = job_data
+    completed_jobs.move_to_end(job_id)
+    while len(completed_jobs) > MAX_COMPLETED_JOBS:
+        completed_jobs.popitem(last=False)
+
+def terminate_process_group(process: subprocess.Popen, timeout: float = 5) -> bool:
+    """SIGTERM the job's whole process group, escalating to SIGKILL after timeout.
+    
+    Returns True if the group had to be killed.
+    """
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return False
+    
+    try:
+        process.wait(timeout=timeout)
+        return False
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+        return True
+
+def _load_json_file(path: str) -> Any:
+    """Read and parse a JSON file (blocking - run via asyncio.to_thread)"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _write_json_file(path: str, data: Any) -> None:
+    """Serialize data to a JSON file (blocking - run via asyncio.to_thread)"""
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+
 class ScrapeConfig(BaseModel):
     max_products: Optional[int] = Field(None, description="Maximum number of products to scrape")
     categories_limit: Optional[int] = Field(None, description="Maximum number of categories to scrape")
@@ -182,15 +255,14 @@ async def get_progress_summary():
         
         if os.path.exists(progress_file):
             try:
-                with open(progress_file, 'r') as f:
-                    progress_data = json.load(f)
-                    current_progress = {
-                        "products_scraped": progress_data.get('total_scraped_items', 0),
-                        "categories_completed": progress_data.get('categories_completed', 0),
-                        "progress_percent": progress_data.get('progress_percent', 0),
-                        "current_task": progress_data.get('current_task', 'Processing...'),
-                        "timestamp": progress_data.get('timestamp_amsterdam', get_amsterdam_time().strftime('%Y-%m-%d %H:%M:%S CET'))
-                    }
+                progress_data = await asyncio.to_thread(_load_json_file, progress_file)
+                current_progress = {
+                    "products_scraped": progress_data.get('total_scraped_items', 0),
+                    "categories_completed": progress_data.get('categories_completed', 0),
+                    "progress_percent": progress_data.get('progress_percent', 0),
+                    "current_task": progress_data.get('current_task', 'Processing...'),
+                    "timestamp": progress_data.get('timestamp_amsterdam', get_amsterdam_time().strftime('%Y-%m-%d %H:%M:%S CET'))
+                }
             except (json.JSONDecodeError, KeyError) as e:
                 logger.warning(f"Could not read progress for job {job_id}: {e}")
         
@@ -239,17 +311,17 @@ async def start_scraping(config: ScrapeConfig, background_tasks: BackgroundTasks
         
         # Save job configuration
         config_file = f"/app/jobs/{job_id}_config.json"
-        with open(config_file, 'w') as f:
-            json.dump(job_config, f, indent=4)
+        await asyncio.to_thread(_write_json_file, config_file, job_config)
         
         # Add to active jobs
-        active_jobs[job_id] = {
-            "job_id": job_id,
-            "status": "queued",
-            "created_at": get_amsterdam_time().isoformat(),
-            "started_at": None,
-            "config": job_config
-        }
+        async with app.state.jobs_lock:
+            active_jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "created_at": get_amsterdam_time().isoformat(),
+                "started_at": None,
+                "config": job_config
+            }
         
         logger.info(f"Created new scraping job: {job_id}")
         
@@ -270,9 +342,10 @@ async def run_scraper_subprocess(job_id: str, config_file: str):
     """Run the Plus scraper as a subprocess"""
     try:
         # Update job status
-        if job_id in active_jobs:
-            active_jobs[job_id]["status"] = "running"
-            active_jobs[job_id]["started_at"] = get_amsterdam_time().isoformat()
+        async with app.state.jobs_lock:
+            if job_id in active_jobs:
+                active_jobs[job_id]["status"] = "running"
+                active_jobs[job_id]["started_at"] = get_amsterdam_time().isoformat()
         
         logger.info(f"Starting scraper subprocess for job {job_id}")
         
@@ -284,23 +357,26 @@ async def run_scraper_subprocess(job_id: str, config_file: str):
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
-            cwd="/app"
+            cwd="/app",
+            start_new_session=True  # Own process group so cancel reaches any children
         )
         
-        job_processes[job_id] = process
+        async with app.state.jobs_lock:
+            job_processes[job_id] = process
         
-        # Wait for completion
-        stdout, stderr = process.communicate()
+        # Wait for completion without blocking the event loop
+        stdout, stderr = await asyncio.to_thread(process.communicate)
         
         if process.returncode == 0:
             logger.info(f"Job {job_id} completed successfully")
             
             # Move to completed jobs
-            if job_id in active_jobs:
-                completed_job = active_jobs.pop(job_id)
-                completed_job["status"] = "completed" 
-                completed_job["completed_at"] = get_amsterdam_time().isoformat()
-                completed_jobs[job_id] = completed_job
+            async with app.state.jobs_lock:
+                if job_id in active_jobs:
+                    completed_job = active_jobs.pop(job_id)
+                    completed_job["status"] = "completed" 
+                    completed_job["completed_at"] = get_amsterdam_time().isoformat()
+                    _record_completed(job_id, completed_job)
             
             # Send webhook notification if configured
             webhook_url = completed_jobs.get(job_id, {}).get("config", {}).get("webhook_url")
@@ -328,21 +404,14 @@ async def run_scraper_subprocess(job_id: str, config_file: str):
                         except Exception as e:
                             logger.warning(f"Could not calculate duration for job {job_id}: {e}")
                     
-                    # Try to get product count from results file
+                    # Try to get product count (completion flag first, results file as fallback)
                     try:
-                        results_file = f"/app/results/{job_id}_products.json"
-                        if os.path.exists(results_file):
-                            with open(results_file, 'r') as f:
-                                results = json.load(f)
-                                if isinstance(results, list):
-                                    payload["products_scraped"] = len(results)
-                                elif isinstance(results, dict):
-                                    payload["products_scraped"] = results.get("total_products", 0)
+                        payload["products_scraped"] = await asyncio.to_thread(count_job_products, job_id)
                     except Exception as e:
                         logger.warning(f"Could not determine product count for job {job_id}: {e}")
                     
                     # Send webhook with proper timeout
-                    response = requests.post(webhook_url, json=payload, timeout=30)
+                    response = await asyncio.to_thread(requests.post, webhook_url, json=payload, timeout=30)
                     if response.status_code == 200:
                         logger.info(f"Webhook notification sent successfully for job {job_id}")
                     else:
@@ -355,31 +424,101 @@ async def run_scraper_subprocess(job_id: str, config_file: str):
             logger.error(f"Job {job_id} failed with return code {process.returncode}")
             logger.error(f"STDERR: {stderr}")
             
-            # Move to completed with failed status
-            if job_id in active_jobs:
-                failed_job = active_jobs.pop(job_id)
-                failed_job["status"] = "failed"
-                failed_job["error"] = stderr
-                failed_job["completed_at"] = get_amsterdam_time().isoformat()
-                completed_jobs[job_id] = failed_job
+            # Move to completed with failed status, unless cancel_job terminated it
+            async with app.state.jobs_lock:
+                if job_id in active_jobs:
+                    failed_job = active_jobs.pop(job_id)
+                    if failed_job.get("status") != "cancelled":
+                        failed_job["status"] = "failed"
+                        failed_job["error"] = stderr[-MAX_ERROR_BYTES:] if stderr else stderr
+                    failed_job["completed_at"] = get_amsterdam_time().isoformat()
+                    _record_completed(job_id, failed_job)
                 
     except Exception as e:
         logger.error(f"Exception in job {job_id}: {e}")
         
         # Move to completed with error status
-        if job_id in active_jobs:
-            error_job = active_jobs.pop(job_id)
-            error_job["status"] = "failed"
-            error_job["error"] = str(e)
-            error_job["completed_at"] = get_amsterdam_time().isoformat()  
-            completed_jobs[job_id] = error_job
+        async with app.state.jobs_lock:
+            if job_id in active_jobs:
+                error_job = active_jobs.pop(job_id)
+                if error_job.get("status") != "cancelled":
+                    error_job["status"] = "failed"
+                    error_job["error"] = str(e)
+                error_job["completed_at"] = get_amsterdam_time().isoformat()  
+                _record_completed(job_id, error_job)
             
     finally:
         # Cleanup
-        if job_id in job_processes:
-            job_processes.pop(job_id)
+        async with app.state.jobs_lock:
+            job_processes.pop(job_id, None)
         logger.info(f"Cleaned up job {job_id}")
 
+def count_job_products(job_id: str) -> Optional[int]:
+    """Determine the number of scraped products without loading the full results file"""
+    # The scraper records total_products in its completion flag - a tiny file
+    complete_flag = f"/app/jobs/{job_id}_complete.flag"
+    if os.path.exists(complete_flag):
+        try:
+            with open(complete_flag, 'r') as f:
+                total_products = json.load(f).get("total_products")
+            if isinstance(total_products, int):
+                return total_products
+        except (json.JSONDecodeError, AttributeError) as e:
+            logger.warning(f"Could not read completion flag for job {job_id}: {e}")
+    
+    results_file = f"/app/results/{job_id}_products.json"
+    if not os.path.exists(results_file):
+        return None
+    
+    with open(results_file, 'rb') as f:
+        if ijson is not None:
+            # Stream over a top-level array, counting items without materializing them
+            _, first_event, _ = next(ijson.parse(f), (None, None, None))
+            f.seek(0)
+            if first_event == 'start_array':
+                return sum(1 for _ in ijson.items(f, 'item'))
+            if first_event == 'start_map':
+                return next(ijson.items(f, 'total_products'), 0)
+            return None
+        
+        results = json.load(f)
+    if isinstance(results, list):
+        return len(results)
+    if isinstance(results, dict):
+        return results.get("total_products", 0)
+    return None
+
+def accepts_zstd(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header lists zstd with a non-zero q-value"""
+    for coding in accept_encoding.split(","):
+        name, *params = [part.strip() for part in coding.split(";")]
+        if name.lower() != "zstd":
+            continue
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+def iter_compressed_results(job_id: str, results_file: str, product_count: int):
+    """Yield the /results response body for a job, zstd-compressed on the fly from the plain JSON.
+    
+    Blocking file reads; StreamingResponse runs this sync generator in a thread pool.
+    """
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    yield compressor.compress(json.dumps({"job_id": job_id, "product_count": product_count})[:-1].encode())
+    yield compressor.compress(b', "products": ')
+    with open(results_file, 'rb') as src:
+        while chunk := src.read(1024 * 1024):
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+    yield compressor.compress(b'}') + compressor.flush()
+
 @app.get("/jobs")
 async def list_jobs():
     """List all jobs"""
@@ -411,31 +550,35 @@ async def cancel_job(job_id: str):
     if job_id not in active_jobs:
         raise HTTPException(status_code=404, detail=f"Active job {job_id} not found")
     
-    # Terminate process if exists
-    if job_id in job_processes:
-        process = job_processes[job_id]
-        if process and process.poll() is None:
-            try:
-                process.terminate()
-                process.wait(timeout=5)
-                logger.info(f"Terminated job {job_id}")
-            except subprocess.TimeoutExpired:
-                process.kill()
+    # Mark cancelled before terminating so run_scraper_subprocess, which may see the
+    # process exit first, records the job as cancelled rather than failed
+    async with app.state.jobs_lock:
+        if job_id in active_jobs:
+            active_jobs[job_id]["status"] = "cancelled"
+        process = job_processes.get(job_id)
+    
+    if process and process.poll() is None:
+        try:
+            killed = await asyncio.to_thread(terminate_process_group, process, 5)
+            if killed:
                 logger.info(f"Killed job {job_id}")
-            except Exception as e:
-                logger.error(f"Error terminating job {job_id}: {e}")
+            else:
+                logger.info(f"Terminated job {job_id}")
+        except Exception as e:
+            logger.error(f"Error terminating job {job_id}: {e}")
     
     # Move to completed with cancelled status
-    if job_id in active_jobs:
-        cancelled_job = active_jobs.pop(job_id)
-        cancelled_job["status"] = "cancelled"
-        cancelled_job["completed_at"] = get_amsterdam_time().isoformat()
-        completed_jobs[job_id] = cancelled_job
+    async with app.state.jobs_lock:
+        if job_id in active_jobs:
+            cancelled_job = active_jobs.pop(job_id)
+            cancelled_job["status"] = "cancelled"
+            cancelled_job["completed_at"] = get_amsterdam_time().isoformat()
+            _record_completed(job_id, cancelled_job)
     
     return {"message": f"Job {job_id} cancelled"}
 
 @app.get("/results/{job_id}")
-async def get_job_results(job_id: str):
+async def get_job_results(job_id: str, request: Request):
     """Get results for a completed job"""
     
     # Check if job exists
@@ -448,14 +591,23 @@ async def get_job_results(job_id: str):
         raise HTTPException(status_code=404, detail=f"Results not found for job {job_id}")
     
     try:
-        with open(results_file, 'r') as f:
-            results = json.load(f)
+        # Counted the same way for both encodings, so one URL always returns one body
+        product_count = await asyncio.to_thread(count_job_products, job_id) or 0
         
-        return {
-            "job_id": job_id,
-            "product_count": len(results) if isinstance(results, list) else 0,
-            "products": results
-        }
+        # Transfer compression only: zstd is applied per request, the plain JSON stays the only copy on disk
+        if zstandard is not None and accepts_zstd(request.headers.get("accept-encoding", "")):
+            return StreamingResponse(
+                iter_compressed_results(job_id, results_file, product_count),
+                media_type="application/json",
+                headers={"Content-Encoding": "zstd", "Vary": "Accept-Encoding"}
+            )
+        
+        results = await asyncio.to_thread(_load_json_file, results_file)
+        
+        return JSONResponse(
+            {"job_id": job_id, "product_count": product_count, "products": results},
+            headers={"Vary": "Accept-Encoding"}
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading results: {str(e)}")
@@ -6,16 +6,43 @@ Based on research findings: 100 products/request, 0.1s intervals, 600 req/min sa
 """
 
 import aiohttp
+import argparse
 import asyncio
 import json
 import os
 import logging
 import time
 import signal
+import hashlib
+import glob
+import re
+import ssl
 from datetime import datetime
+from contextlib import aclosing
+from functools import lru_cache
 from random import uniform
 from typing import Dict, List, Optional, Tuple
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import aiofiles
+except ImportError:
+    aiofiles = None
+
 # Import progress monitoring (maintains compatibility with runner system)
 import sys
 
@@ -60,9 +87,12 @@ except ImportError:
             base_dir = os.path.dirname(os.path.abspath(__file__))
             return os.path.join(base_dir, "results")
 
+# Detect container vs local environment once for the whole module
+IN_CONTAINER = os.path.exists('/app')
+
 # Setup logging (will be overridden by wrapper for job-specific logging)
 # Detect environment for logging directory
-if os.path.exists('/app'):
+if IN_CONTAINER:
     log_dir = os.getenv('JUMBO_LOG_DIR', '/app/logs')
 else:
     # Local environment
@@ -81,6 +111,52 @@ logging.basicConfig(
 
 logging.getLogger('aiohttp').setLevel(logging.WARNING)
 
+# Fast JSON helpers (orjson when available, stdlib json otherwise)
+def json_loads(raw):
+    """Parse JSON from bytes or str."""
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+def json_dumps_line(obj) -> bytes:
+    """Serialize obj as a single UTF-8 JSON line (trailing newline included)."""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+    return (json.dumps(obj, ensure_ascii=False) + '\n').encode('utf-8')
+
+def json_dumps_str(obj) -> str:
+    """Serialize request bodies for aiohttp's json_serialize hook."""
+    return orjson.dumps(obj).decode('utf-8') if orjson else json.dumps(obj)
+
+def _write_bytes(path: str, data: bytes, mode: str):
+    with open(path, mode) as f:
+        f.write(data)
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+async def read_file_async(path: str) -> bytes:
+    """Read a whole file as bytes without blocking the event loop."""
+    if aiofiles is not None:
+        async with aiofiles.open(path, 'rb') as f:
+            return await f.read()
+    return await asyncio.to_thread(_read_bytes, path)
+
+async def write_file_async(path: str, data: bytes, mode: str = 'wb'):
+    """Write bytes without blocking the event loop (aiofiles, or a worker thread as fallback)."""
+    if aiofiles is not None:
+        async with aiofiles.open(path, mode) as f:
+            await f.write(data)
+    else:
+        await asyncio.to_thread(_write_bytes, path, data, mode)
+
+async def wait_or_timeout(event: asyncio.Event, timeout: float) -> bool:
+    """Wait up to timeout seconds for event; True if it was set."""
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
 # GraphQL endpoint and headers (validated from research)
 GRAPHQL_ENDPOINT = 'https://www.jumbo.com/api/graphql'
 HEADERS = {
@@ -97,22 +173,317 @@ HEADERS = {
     'x-source': 'JUMBO_MOBILE-search',
 }
 
+# One TLS context shared by every connection (aiohttp and httpx)
+SSL_CONTEXT = ssl.create_default_context()
+
+# HTTP/2 forbids connection-specific headers
+HTTP2_HEADERS = {key: value for key, value in HEADERS.items() if key != 'Connection'}
+
 # OPTIMIZATION PARAMETERS (from research findings)
 OPTIMAL_BATCH_SIZE = 100  # Validated optimal: 62 products/second
 SAFE_REQUEST_INTERVAL = 0.1  # 600 requests/minute safe limit
 MAX_CONCURRENT_REQUESTS = 5  # Conservative concurrent limit
 FALLBACK_BATCH_SIZE = 30  # Fallback if large batches fail
+RATE_LIMIT_BURST = 10  # Requests allowed back-to-back before the token bucket paces them
+MIN_REQUEST_RATE = 0.5  # Floor for the 429 back-off (one request per 2s)
+PAGINATION_WINDOW = MAX_CONCURRENT_REQUESTS  # Offset requests in flight per category
+QUERY_BATCH_SIZE = 5  # Offsets aliased into a single GraphQL operation
+OFFSET_PLACEHOLDER = -987654321  # Marks offSet positions in cached request body templates
+CHECKPOINT_INTERVAL = 15  # Seconds between background progress saves
+LIVE_PROGRESS_INTERVAL = 0.5  # Seconds between live progress (monitoring) writes
+CONCURRENCY_RECOVERY_STREAK = 50  # Successful requests before a lowered concurrency cap is raised again
+
+# Selection sets shared by single and batched product searches
+SEARCH_PRODUCTS_CORE_SELECTION = """{
+    id
+    start
+    count
+    products {
+      ...SearchProductCore
+      __typename
+    }
+    __typename
+  }"""
+
+SEARCH_PRODUCTS_SELECTION = """{
+    id
+    start
+    count
+    pageHeader {
+      headerText
+      count
+      __typename
+    }
+    products {
+      ...SearchProductFull
+      crossSells {
+        sku
+        __typename
+      }
+      __typename
+    }
+    __typename
+  }"""
+
+SEARCH_PRODUCT_FULL_FRAGMENT = """fragment SearchProductFull on Product {
+  id: sku
+  brand
+  category: rootCategory
+  subtitle: packSizeDisplay
+  title
+  image
+  inAssortment
+  availability {
+    availability
+    isAvailable
+    label
+    stockLimit
+    reason
+    availabilityNote
+    __typename
+  }
+  sponsored
+  auctionId
+  link
+  retailSet
+  prices: price {
+    price
+    promoPrice
+    pricePerUnit {
+      price
+      unit
+      __typename
+    }
+    __typename
+  }
+  quantityDetails {
+    maxAmount
+    minAmount
+    stepAmount
+    defaultAmount
+    __typename
+  }
+  primaryBadge: primaryProductBadges {
+    alt
+    image
+    __typename
+  }
+  secondaryBadges: secondaryProductBadges {
+    alt
+    image
+    __typename
+  }
+  customerAllergies {
+    short
+    __typename
+  }
+  promotions {
+    id
+    group
+    isKiesAndMix
+    image
+    tags {
+      text
+      inverse
+      __typename
+    }
+    start {
+      dayShort
+      date
+      monthShort
+      __typename
+    }
+    end {
+      dayShort
+      date
+      monthShort
+      __typename
+    }
+    attachments {
+      type
+      path
+      __typename
+    }
+    primaryBadge: primaryBadges {
+      alt
+      image
+      __typename
+    }
+    volumeDiscounts {
+      discount
+      volume
+      __typename
+    }
+    durationTexts {
+      shortTitle
+      __typename
+    }
+    __typename
+  }
+  surcharges {
+    type
+    value {
+      amount
+      currency
+      __typename
+    }
+    __typename
+  }
+}"""
+
+# Fields the processor reads (prices, quantity, availability, promotion tags, ...)
+SEARCH_PRODUCT_CORE_FRAGMENT = """fragment SearchProductCore on Product {
+  id: sku
+  brand
+  category: rootCategory
+  subtitle: packSizeDisplay
+  title
+  image
+  inAssortment
+  availability {
+    availability
+    isAvailable
+  }
+  prices: price {
+    price
+    promoPrice
+    pricePerUnit {
+      price
+      unit
+    }
+  }
+  quantityDetails {
+    maxAmount
+    minAmount
+    stepAmount
+    defaultAmount
+  }
+  promotions {
+    id
+    tags {
+      text
+    }
+    start {
+      date
+    }
+    end {
+      date
+    }
+  }
+}"""
+
+# Detail level -> (selection set, fragment); 'full' keeps every field for raw archival
+PRODUCT_DETAIL_LEVELS = {
+    'core': (SEARCH_PRODUCTS_CORE_SELECTION, SEARCH_PRODUCT_CORE_FRAGMENT),
+    'full': (SEARCH_PRODUCTS_SELECTION, SEARCH_PRODUCT_FULL_FRAGMENT),
+}
+
+
+@lru_cache(maxsize=None)
+def build_products_query(detail_level: str = 'core') -> str:
+    """Single-offset query text; built once per detail level."""
+    selection, fragment = PRODUCT_DETAIL_LEVELS[detail_level]
+    return ("query SearchMobileProducts($input: ProductSearchInput!) {\n"
+            "  searchProducts(input: $input) " + selection + "\n}\n\n" + fragment)
+
+
+@lru_cache(maxsize=None)
+def build_products_batch_query(batch_size: int, detail_level: str = 'core') -> str:
+    """Aliased multi-offset query text; built once per batch size and detail level."""
+    selection, fragment = PRODUCT_DETAIL_LEVELS[detail_level]
+    variable_defs = ", ".join(f"$input{i}: ProductSearchInput!" for i in range(batch_size))
+    fields = "\n".join(
+        f"  p{i}: searchProducts(input: $input{i}) " + selection
+        for i in range(batch_size)
+    )
+    return f"query SearchMobileProductsBatch({variable_defs}) {{\n{fields}\n}}\n\n" + fragment
+
+
+@lru_cache(maxsize=None)
+def query_sha256(query: str) -> str:
+    """SHA-256 of a query for Automatic Persisted Queries."""
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class TokenBucket:
+    """Shared request-rate limiter: `rate` tokens per second, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 10):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class DynamicLimiter:
+    """Concurrency limiter whose cap can change mid-run.
+    
+    asyncio.Semaphore offers no supported way to resize, so this keeps an explicit
+    active counter guarded by an asyncio.Condition.
+    """
+
+    def __init__(self, cap: int, max_cap: Optional[int] = None):
+        self.cap = cap
+        self.max_cap = max_cap or cap
+        self.active = 0
+        self.cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.active < self.cap)
+            self.active += 1
+
+    async def release(self):
+        async with self.cond:
+            self.active -= 1
+            self.cond.notify(1)
+
+    async def set_cap(self, new_cap: int):
+        async with self.cond:
+            self.cap = max(1, min(new_cap, self.max_cap))
+            self.cond.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+
+class BatchQueryRejected(Exception):
+    """Raised when the API refuses an aliased multi-offset query (HTTP 413/422)."""
+
+    def __init__(self, status: int):
+        super().__init__(f"Batched query rejected with HTTP {status}")
+        self.status = status
+
 
 class JumboGraphQLOptimizedScraper:
-    def __init__(self, max_products=None, categories_limit=None):
+    def __init__(self, max_products=None, categories_limit=None, full_details=False, install_signal_handlers=True):
         self.graphql_url = GRAPHQL_ENDPOINT
         self.max_products = max_products
         self.categories_limit = categories_limit
+        # 'core' fetches only the fields the processor uses; 'full' keeps the complete product blob
+        self.detail_level = 'full' if full_details else 'core'
+        self.optimization_version = "phase2b_complete_data" if full_details else "phase2b_core_data"
         self.output_dir = get_output_directory()
         self.products_file = f"{self.output_dir}/jumbo_products.json"
         
         # Use environment-aware paths with container/local detection
-        if os.path.exists('/app'):
+        if IN_CONTAINER:
             # Container environment
             data_dir = os.getenv('JUMBO_DATA_DIR', '/app/shared-data')
             progress_dir = os.getenv('JUMBO_PROGRESS_DIR', '/app/jobs')
@@ -130,6 +501,9 @@ class JumboGraphQLOptimizedScraper:
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(data_dir, exist_ok=True)
         os.makedirs(progress_dir, exist_ok=True)
+        
+        # One directory scan answers every startup existence check below
+        self._state_cache = self.snapshot_state(self.output_dir, data_dir, progress_dir)
 
         # Performance tracking
         self.scraped_products = set()
@@ -141,6 +515,10 @@ class JumboGraphQLOptimizedScraper:
         self.current_offset = 0
         self.successful_requests = 0
         self.failed_requests = 0
+        self.response_bytes = 0
+        self.live_progress = None  # Latest update_progress() fields; written by live_progress_loop()
+        self._live_progress_written = None
+        self.compacted_products = None  # Products in the final JSON array, set after compaction
         self.estimated_total_products = 23000  # More accurate estimate
         
         # Performance metrics
@@ -152,13 +530,26 @@ class JumboGraphQLOptimizedScraper:
         self.base_delay = SAFE_REQUEST_INTERVAL
         self.timeout_config = aiohttp.ClientTimeout(total=30, connect=10)
         self.shutdown_requested = False
+        
+        # Global request pacing (keeps 600 req/min across parallel fetches)
+        self.bucket = TokenBucket(rate=1 / SAFE_REQUEST_INTERVAL, burst=RATE_LIMIT_BURST)
+        self.batch_queries_enabled = True  # Disabled if the API rejects aliased queries
+        self.limiter = None  # DynamicLimiter shared by all page fetches, created in run()
+        self._success_streak = 0
+        self._session = None  # aiohttp session, owned by the async context (__aenter__/__aexit__)
+        self._context_depth = 0
+        self.http2_client = None  # httpx HTTP/2 client, owned by the async context
+        self.persisted_queries_enabled = True  # Automatic Persisted Queries, off once the server refuses them
+        self._body_templates = {}  # Pre-serialized request bodies split at the offSet values
+        self._http_version_logged = False
 
-        # Setup signal handlers
-        signal.signal(signal.SIGINT, self.signal_handler)
-        signal.signal(signal.SIGTERM, self.signal_handler)
+        # Setup signal handlers (skipped when hosted in-process, where the host owns signals)
+        if install_signal_handlers:
+            signal.signal(signal.SIGINT, self.signal_handler)
+            signal.signal(signal.SIGTERM, self.signal_handler)
 
         # Check completion status
-        self.scraping_completed = os.path.exists(self.completed_flag)
+        self.scraping_completed = self.path_exists(self.completed_flag)
         if self.scraping_completed:
             logging.info("✅ Previous run completed successfully. Skipping scraping.")
             self.load_existing_data()
@@ -168,9 +559,63 @@ class JumboGraphQLOptimizedScraper:
 
         logging.info(f"🚀 OPTIMIZED SCRAPER INITIALIZED")
         logging.info(f"   Target batch size: {self.current_batch_size} products/request")
-        logging.info(f"   Request interval: {self.base_delay}s ({60/self.base_delay:.0f} req/min)")
+        logging.info(f"   Request rate: {self.bucket.rate * 60:.0f} req/min (burst {self.bucket.burst})")
         logging.info(f"   Expected improvement: {self.current_batch_size/30:.1f}x vs original")
 
+    @staticmethod
+    def snapshot_state(*directories) -> Dict[str, set]:
+        """Map each directory to the set of paths it contains (one scandir per directory)."""
+        state = {}
+        for directory in directories:
+            if directory in state:
+                continue
+            try:
+                with os.scandir(directory) as entries:
+                    state[directory] = {entry.path for entry in entries}
+            except OSError:
+                state[directory] = set()
+        return state
+
+    def path_exists(self, path: str) -> bool:
+        """Existence check against the startup snapshot, falling back to a stat for unscanned dirs."""
+        entries = self._state_cache.get(os.path.dirname(path))
+        if entries is None:
+            return os.path.exists(path)
+        return path in entries
+
+    async def __aenter__(self):
+        """Open the connector, aiohttp session (with saved cookies) and HTTP/2 client once.
+        
+        Re-entrant: nested `async with` blocks and repeated run() calls share the same session.
+        """
+        if self._context_depth == 0:
+            connector = aiohttp.TCPConnector(
+                limit=MAX_CONCURRENT_REQUESTS * 2,
+                limit_per_host=MAX_CONCURRENT_REQUESTS,
+                use_dns_cache=True,
+                ttl_dns_cache=300,  # Single host for the whole run
+                ssl=SSL_CONTEXT,
+                keepalive_timeout=75
+            )
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout_config,
+                json_serialize=json_dumps_str,
+                connector=connector,
+                cookies=self.session_cookies
+            )
+            self.http2_client = self.create_http2_client()
+        self._context_depth += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._context_depth -= 1
+        if self._context_depth == 0:
+            if self.http2_client is not None:
+                await self.http2_client.aclose()
+                self.http2_client = None
+            await self._session.close()
+            self._session = None
+
     def signal_handler(self, signum, frame):
         """Handle shutdown signals gracefully."""
         logging.info(f"🛑 Received signal {signum}, shutting down gracefully...")
@@ -179,10 +624,17 @@ class JumboGraphQLOptimizedScraper:
 
     def load_existing_data(self):
         """Load existing product data for reporting."""
-        if os.path.exists(self.products_file):
+        shard_files = self.product_shard_files()
+        if shard_files:
+            self.total_scraped = 0
+            for shard_file in shard_files:
+                with open(shard_file, 'rb') as f:
+                    self.total_scraped += sum(1 for line in f if line.strip())
+            logging.info(f"📊 Found {self.total_scraped} products from completed run")
+        elif self.path_exists(self.products_file):
             try:
-                with open(self.products_file, 'r') as f:
-                    existing_products = json.load(f)
+                with open(self.products_file, 'rb') as f:
+                    existing_products = json_loads(f.read())
                     self.total_scraped = len(existing_products)
                     logging.info(f"📊 Found {self.total_scraped} products from completed run")
             except (json.JSONDecodeError, FileNotFoundError):
@@ -190,11 +642,20 @@ class JumboGraphQLOptimizedScraper:
 
     def load_progress(self):
         """Load previous scraping progress."""
-        if os.path.exists(self.progress_file):
+        if self.path_exists(self.progress_file):
             try:
-                with open(self.progress_file, 'r') as f:
-                    progress = json.load(f)
-                    self.scraped_products = set(progress.get('scraped_products', []))
+                with open(self.progress_file, 'rb') as f:
+                    progress = json_loads(f.read())
+                    ids_files = glob.glob(os.path.join(self.products_shard_dir, '*.ids'))
+                    if ids_files:
+                        # Build the set line by line; avoids holding whole files and list copies
+                        self.scraped_products = set()
+                        for ids_file in ids_files:
+                            with open(ids_file, 'r', encoding='utf-8') as ids_f:
+                                self.scraped_products.update(line.rstrip('\n') for line in ids_f if line.strip())
+                    else:
+                        # Older progress files embedded the id list
+                        self.scraped_products = set(progress.get('scraped_products', []))
                     self.total_scraped = progress.get('total_scraped', 0)
                     self.current_offset = progress.get('current_offset', 0)
                     
@@ -212,10 +673,10 @@ class JumboGraphQLOptimizedScraper:
 
     def load_session(self):
         """Load session cookies if they exist."""
-        if os.path.exists(self.session_file):
+        if self.path_exists(self.session_file):
             try:
-                with open(self.session_file, 'r') as f:
-                    session_data = json.load(f)
+                with open(self.session_file, 'rb') as f:
+                    session_data = json_loads(f.read())
                     self.session_cookies = session_data.get('cookies', {})
                     session_time = session_data.get('timestamp', 0)
                     if time.time() - session_time < 3600:  # 1 hour
@@ -227,7 +688,7 @@ class JumboGraphQLOptimizedScraper:
                 logging.warning("⚠️ Session file corrupted, will create new session")
                 self.session_cookies = {}
 
-    def save_progress(self, current_offset=None):
+    async def save_progress(self, current_offset=None):
         """Save current scraping progress with optimization metrics."""
         if current_offset is not None:
             self.current_offset = current_offset
@@ -238,8 +699,8 @@ class JumboGraphQLOptimizedScraper:
             self.products_per_second = self.total_scraped / elapsed_time
             self.requests_per_minute = (self.successful_requests / elapsed_time) * 60 if elapsed_time > 0 else 0
         
+        # Scraped ids live in the append-only per-shard .ids files, keeping this checkpoint O(1)
         progress_data = {
-            'scraped_products': list(self.scraped_products),
             'total_scraped': self.total_scraped,
             'current_offset': self.current_offset,
             
@@ -256,14 +717,45 @@ class JumboGraphQLOptimizedScraper:
             'timestamp_amsterdam': get_amsterdam_time().strftime('%Y-%m-%d %H:%M:%S CET')
         }
         
-        with open(self.progress_file, 'w') as f:
-            json.dump(progress_data, f, indent=4)
+        # Write-then-rename so pollers never read a half-written checkpoint
+        tmp_file = f"{self.progress_file}.tmp"
+        await write_file_async(tmp_file, json_dumps_line(progress_data))
+        await asyncio.to_thread(os.replace, tmp_file, self.progress_file)
 
-    def save_session(self, session):
+    async def checkpoint_loop(self, interval: float, stop: asyncio.Event):
+        """Single progress writer: snapshot counters every interval seconds until stop is set.
+        
+        Stopped rather than cancelled, so a write already in a worker thread always finishes
+        before run() does its final save.
+        """
+        while not self.shutdown_requested:
+            if await wait_or_timeout(stop, interval):
+                return
+            try:
+                await self.save_progress()
+            except OSError as e:
+                logging.warning(f"⚠️ Failed to save progress checkpoint: {e}")
+
+    async def flush_live_progress(self):
+        """Write the latest live progress snapshot if it changed since the last write."""
+        state = self.live_progress
+        if state is None or state is self._live_progress_written:
+            return
+        self._live_progress_written = state
+        await asyncio.to_thread(update_progress, 'jumbo', **state)
+
+    async def live_progress_loop(self, interval: float, stop: asyncio.Event):
+        """Batch per-page progress updates into at most one monitoring write per interval."""
+        while not self.shutdown_requested:
+            if await wait_or_timeout(stop, interval):
+                return
+            await self.flush_live_progress()
+
+    async def save_session(self):
         """Save session cookies for reuse."""
-        if session.cookie_jar:
+        if self._session.cookie_jar:
             cookies = {}
-            for cookie in session.cookie_jar:
+            for cookie in self._session.cookie_jar:
                 cookies[cookie.key] = cookie.value
 
             session_data = {
@@ -272,44 +764,105 @@ class JumboGraphQLOptimizedScraper:
                 'timestamp_amsterdam': get_amsterdam_time().strftime('%Y-%m-%d %H:%M:%S CET')
             }
 
-            with open(self.session_file, 'w') as f:
-                json.dump(session_data, f, indent=4)
+            await write_file_async(self.session_file, json.dumps(session_data, indent=4).encode('utf-8'))
 
             self.session_cookies = cookies
             logging.info("💾 Saved session cookies")
 
-    def save_products(self, products):
-        """Save or update products with deduplication."""
+    @property
+    def products_shard_dir(self):
+        """Directory of per-category JSONL shards next to the final products JSON."""
+        return os.path.splitext(self.products_file)[0]
+
+    def product_shard_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.products_shard_dir, '*.jsonl')))
+
+    async def save_products(self, products, shard: str):
+        """Append new products to the category's JSONL shard and its .ids sidecar.
+        
+        Each category task owns its shard, so appends need no locking. Deduplication
+        happens upstream against self.scraped_products, so this never reads back the
+        file; compact_to_json() produces the final JSON array.
+        """
         if not products:
             return
 
-        # Load existing products
-        existing_products = []
-        existing_ids = set()
-        if os.path.exists(self.products_file):
-            try:
-                with open(self.products_file, 'r') as f:
-                    existing_products = json.load(f)
-                    existing_ids = {p.get('product', {}).get('id') for p in existing_products if p.get('product', {}).get('id')}
-            except (json.JSONDecodeError, FileNotFoundError):
-                logging.warning("⚠️ Products file corrupted or missing, starting fresh")
-                existing_products = []
-                existing_ids = set()
+        rows = b''.join(json_dumps_line(product) for product in products)
+        ids = ''.join(f"{product['product']['id']}\n" for product in products).encode('utf-8')
 
-        # Add new products
-        new_products = []
-        for product in products:
-            product_id = product.get('product', {}).get('id')
-            if product_id and product_id not in existing_ids:
-                new_products.append(product)
-                existing_ids.add(product_id)
+        shard_path = os.path.join(self.products_shard_dir, shard)
+        await write_file_async(f"{shard_path}.jsonl", rows, 'ab')
+        await write_file_async(f"{shard_path}.ids", ids, 'ab')
 
-        existing_products.extend(new_products)
+        logging.info(f"💾 Saved {len(products)} new products (total: {self.total_scraped + len(products)})")
+
+    def import_legacy_products(self):
+        """Seed a shard from a products JSON array written before shards existed.
+        
+        Legacy progress files already mark those ids as scraped, so a resumed run would never
+        re-fetch them and compact_to_json() would otherwise drop them.
+        """
+        if self.product_shard_files() or not os.path.exists(self.products_file):
+            return 0
+        try:
+            with open(self.products_file, 'rb') as f:
+                products = json_loads(f.read())
+        except json.JSONDecodeError:
+            logging.warning(f"⚠️ Could not import legacy products from {self.products_file}: invalid JSON")
+            return 0
+        if not isinstance(products, list) or not products:
+            return 0
 
-        with open(self.products_file, 'w') as f:
-            json.dump(existing_products, f, indent=4, ensure_ascii=False)
+        shard_path = os.path.join(self.products_shard_dir, 'legacy')
+        ids = ''.join(f"{product['product']['id']}\n" for product in products
+                      if isinstance(product, dict) and product.get('product', {}).get('id'))
+        with open(f"{shard_path}.ids.tmp", 'w', encoding='utf-8') as f:
+            f.write(ids)
+        with open(f"{shard_path}.jsonl.tmp", 'wb') as f:
+            f.write(b''.join(json_dumps_line(product) for product in products))
+        # The .jsonl appearing last marks the import as done
+        os.replace(f"{shard_path}.ids.tmp", f"{shard_path}.ids")
+        os.replace(f"{shard_path}.jsonl.tmp", f"{shard_path}.jsonl")
 
-        logging.info(f"💾 Saved {len(new_products)} new products (total: {len(existing_products)})")
+        logging.info(f"📥 Imported {len(products)} products from legacy {self.products_file}")
+        return len(products)
+
+    def compact_to_json(self):
+        """Concatenate the JSONL shards into the products JSON array consumers expect.
+        
+        Lines are copied verbatim (no re-serialization); duplicate ids left over from
+        earlier interrupted runs are dropped.
+        """
+        shard_files = self.product_shard_files()
+
+        # Written even without shards, so a run that found nothing still has a (empty) results file
+        seen_ids = set()
+        count = 0
+        tmp_file = f"{self.products_file}.tmp"
+        with open(tmp_file, 'wb') as dst:
+            dst.write(b'[')
+            for shard_file in shard_files:
+                with open(shard_file, 'rb') as src:
+                    for line in src:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            product_id = json_loads(line).get('product', {}).get('id')
+                        except json.JSONDecodeError:
+                            logging.warning(f"⚠️ Skipping truncated line in {shard_file}")
+                            continue
+                        if product_id in seen_ids:
+                            continue
+                        seen_ids.add(product_id)
+                        dst.write(b',\n' if count else b'\n')
+                        dst.write(line)
+                        count += 1
+            dst.write(b'\n]\n')
+        os.replace(tmp_file, self.products_file)
+
+        logging.info(f"📦 Compacted {count} products into {self.products_file}")
+        return count
 
     def get_categories_query(self):
         """GraphQL query for fetching categories."""
@@ -343,6 +896,19 @@ class JumboGraphQLOptimizedScraper:
 }"""
         }
 
+    def get_products_search_input(self, category_friendly_url, offset=0):
+        """Search input variables for a single category page."""
+        return {
+            "id": "MobileProducts",
+            "searchType": "category",
+            "searchTerms": "producten",
+            "friendlyUrl": category_friendly_url,
+            "offSet": offset,
+            "currentUrl": f"/producten/{category_friendly_url}",
+            "previousUrl": "",
+            "bloomreachCookieId": ""
+        }
+
     def get_products_query(self, category_friendly_url, offset=0, limit=None):
         """OPTIMIZED: GraphQL query with configurable batch size."""
         if limit is None:
@@ -351,148 +917,113 @@ class JumboGraphQLOptimizedScraper:
         return {
             "operationName": "SearchMobileProducts",
             "variables": {
-                "input": {
-                    "id": "MobileProducts",
-                    "searchType": "category",
-                    "searchTerms": "producten",
-                    "friendlyUrl": category_friendly_url,
-                    "offSet": offset,
-                    "currentUrl": f"/producten/{category_friendly_url}",
-                    "previousUrl": "",
-                    "bloomreachCookieId": ""
-                }
+                "input": self.get_products_search_input(category_friendly_url, offset)
             },
-            "query": """query SearchMobileProducts($input: ProductSearchInput!) {
-  searchProducts(input: $input) {
-    id
-    start
-    count
-    pageHeader {
-      headerText
-      count
-      __typename
-    }
-    products {
-      ...SearchProductDetails
-      crossSells {
-        sku
-        __typename
-      }
-      __typename
-    }
-    __typename
-  }
-}
+            "query": build_products_query(self.detail_level)
+        }
 
-fragment SearchProductDetails on Product {
-  id: sku
-  brand
-  category: rootCategory
-  subtitle: packSizeDisplay
-  title
-  image
-  inAssortment
-  availability {
-    availability
-    isAvailable
-    label
-    stockLimit
-    reason
-    availabilityNote
-    __typename
-  }
-  sponsored
-  auctionId
-  link
-  retailSet
-  prices: price {
-    price
-    promoPrice
-    pricePerUnit {
-      price
-      unit
-      __typename
-    }
-    __typename
-  }
-  quantityDetails {
-    maxAmount
-    minAmount
-    stepAmount
-    defaultAmount
-    __typename
-  }
-  primaryBadge: primaryProductBadges {
-    alt
-    image
-    __typename
-  }
-  secondaryBadges: secondaryProductBadges {
-    alt
-    image
-    __typename
-  }
-  customerAllergies {
-    short
-    __typename
-  }
-  promotions {
-    id
-    group
-    isKiesAndMix
-    image
-    tags {
-      text
-      inverse
-      __typename
-    }
-    start {
-      dayShort
-      date
-      monthShort
-      __typename
-    }
-    end {
-      dayShort
-      date
-      monthShort
-      __typename
-    }
-    attachments {
-      type
-      path
-      __typename
-    }
-    primaryBadge: primaryBadges {
-      alt
-      image
-      __typename
-    }
-    volumeDiscounts {
-      discount
-      volume
-      __typename
-    }
-    durationTexts {
-      shortTitle
-      __typename
-    }
-    __typename
-  }
-  surcharges {
-    type
-    value {
-      amount
-      currency
-      __typename
-    }
-    __typename
-  }
-}"""
+    def get_products_query_batch(self, category_friendly_url, offsets: List[int]):
+        """BATCHED: One GraphQL operation with an aliased searchProducts per offset (p0, p1, ...)."""
+        return {
+            "operationName": "SearchMobileProductsBatch",
+            "variables": {
+                f"input{i}": self.get_products_search_input(category_friendly_url, offset)
+                for i, offset in enumerate(offsets)
+            },
+            "query": build_products_batch_query(len(offsets), self.detail_level)
         }
 
-    async def make_graphql_request(self, session: aiohttp.ClientSession, query_data: Dict) -> Tuple[Optional[Dict], float, bool]:
-        """OPTIMIZED: Enhanced GraphQL request with performance tracking."""
+    def create_http2_client(self):
+        """HTTP/2 client for GraphQL POSTs (multiplexed streams, HPACK); None if httpx/h2 are missing."""
+        if httpx is None:
+            return None
+        try:
+            return httpx.AsyncClient(
+                http2=True,
+                headers=HTTP2_HEADERS,
+                cookies=self.session_cookies,
+                timeout=httpx.Timeout(30.0, connect=10.0),
+                verify=SSL_CONTEXT,
+                limits=httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS * 2,
+                                    max_keepalive_connections=MAX_CONCURRENT_REQUESTS,
+                                    keepalive_expiry=60),
+            )
+        except ImportError:
+            logging.warning("⚠️ h2 not installed, using aiohttp (HTTP/1.1) for GraphQL requests")
+            return None
+
+    async def post_graphql(self, query_data: Dict) -> Tuple[int, bytes]:
+        """POST a GraphQL operation, sending only the persisted-query hash when the server supports APQ.
+        
+        On PersistedQueryNotFound the full query is resent with the hash so the server registers
+        it; if the server does not support APQ at all, hashing is switched off for the run.
+        """
+        if not self.persisted_queries_enabled or 'query' not in query_data:
+            return await self.send_graphql(query_data)
+
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_sha256(query_data['query'])}}
+        hashed_query = {key: value for key, value in query_data.items() if key != 'query'}
+        hashed_query['extensions'] = extensions
+        status, raw = await self.send_graphql(hashed_query)
+
+        if b'PersistedQueryNotFound' in raw or b'PERSISTED_QUERY_NOT_FOUND' in raw:
+            # Unknown hash: register it by sending the full query alongside the extension
+            return await self.send_graphql({**query_data, 'extensions': extensions})
+        if status == 200 and b'"data"' in raw:
+            return status, raw
+        if status in (200, 400):
+            # Server did not understand the hash-only request
+            logging.info("ℹ️ Persisted queries not supported, sending full query text")
+            self.persisted_queries_enabled = False
+            return await self.send_graphql(query_data)
+        return status, raw
+
+    def encode_query(self, query_data: Dict) -> bytes:
+        """Serialize a GraphQL payload, splicing offsets into a cached body template.
+        
+        Product queries differ only in their offSet values, so each payload shape
+        (operation, category, batch size, query/extensions present) is serialized once
+        with placeholder offsets and later requests only join in the new numbers.
+        """
+        inputs = list(query_data.get('variables', {}).values())
+        if not inputs or not all(isinstance(value, dict) and 'offSet' in value for value in inputs):
+            return json_dumps_str(query_data).encode('utf-8')
+
+        key = (query_data.get('operationName'), inputs[0].get('friendlyUrl'), len(inputs),
+               'query' in query_data, 'extensions' in query_data)
+        parts = self._body_templates.get(key)
+        if parts is None:
+            template = {**query_data, 'variables': {
+                name: {**value, 'offSet': OFFSET_PLACEHOLDER}
+                for name, value in query_data['variables'].items()
+            }}
+            parts = json_dumps_str(template).encode('utf-8').split(b'%d' % OFFSET_PLACEHOLDER)
+            self._body_templates[key] = parts
+
+        return parts[0] + b''.join(b'%d' % value['offSet'] + part for value, part in zip(inputs, parts[1:]))
+
+    async def send_graphql(self, query_data: Dict) -> Tuple[int, bytes]:
+        """POST a GraphQL payload and return (status, raw body), over HTTP/2 when available."""
+        body = self.encode_query(query_data)
+        await self.bucket.acquire()
+        if self.http2_client is not None:
+            response = await self.http2_client.post(self.graphql_url, content=body)
+            if not self._http_version_logged:
+                logging.info(f"🔌 GraphQL transport: {response.http_version}")
+                self._http_version_logged = True
+            self.response_bytes += len(response.content)
+            return response.status_code, response.content
+
+        async with self._session.post(self.graphql_url, headers=HEADERS, data=body) as response:
+            raw = await response.read()
+            self.response_bytes += len(raw)
+            return response.status, raw
+
+    async def make_graphql_request(self, query_data: Dict, reject_statuses: Tuple[int, ...] = ()) -> Tuple[Optional[Dict], float, bool]:
+        """OPTIMIZED: Enhanced GraphQL request with performance tracking.
+        
+        Raises BatchQueryRejected for any status in reject_statuses so callers can fall back.
+        """
         start_time = time.time()
         
         for attempt in range(self.max_retries):
@@ -501,34 +1032,40 @@ fragment SearchProductDetails on Product {
                     delay = self.base_delay * (2 ** attempt) + uniform(0, 0.5)
                     await asyncio.sleep(delay)
 
-                async with session.post(self.graphql_url, headers=HEADERS, json=query_data) as response:
-                    duration = time.time() - start_time
-                    
-                    if response.status == 200:
-                        try:
-                            data = await response.json()
-                            success = 'data' in data and not data.get('errors')
-                            
-                            if success:
-                                self.successful_requests += 1
-                            else:
-                                self.failed_requests += 1
-                                logging.warning(f"GraphQL errors: {data.get('errors', [])}")
-                            
-                            return data.get('data'), duration, success
-                        except json.JSONDecodeError:
+                status, raw = await self.post_graphql(query_data)
+                duration = time.time() - start_time
+                
+                if status == 200:
+                    try:
+                        data = json_loads(raw)
+                        success = 'data' in data and not data.get('errors')
+                        
+                        if success:
+                            self.successful_requests += 1
+                            await self.on_request_success()
+                        else:
                             self.failed_requests += 1
-                            return None, duration, False
-                            
-                    elif response.status == 429:
-                        logging.warning(f"Rate limited on attempt {attempt + 1}, increasing delay")
-                        self.base_delay = min(self.base_delay * 1.5, 2.0)  # Adaptive rate limiting
-                        await asyncio.sleep(5)
-                        continue
-                    else:
-                        logging.warning(f"HTTP {response.status} on attempt {attempt + 1}")
+                            logging.warning(f"GraphQL errors: {data.get('errors', [])}")
+                        
+                        return data.get('data'), duration, success
+                    except json.JSONDecodeError:
+                        self.failed_requests += 1
                         return None, duration, False
+                        
+                elif status == 429:
+                    logging.warning(f"Rate limited on attempt {attempt + 1}, increasing delay")
+                    self.bucket.rate = max(self.bucket.rate / 1.5, MIN_REQUEST_RATE)  # Adaptive rate limiting
+                    await self.on_rate_limited()
+                    await asyncio.sleep(5)
+                    continue
+                elif status in reject_statuses:
+                    raise BatchQueryRejected(status)
+                else:
+                    logging.warning(f"HTTP {status} on attempt {attempt + 1}")
+                    return None, duration, False
 
+            except BatchQueryRejected:
+                raise
             except Exception as e:
                 logging.warning(f"Request error on attempt {attempt + 1}: {e}")
                 continue
@@ -536,6 +1073,21 @@ fragment SearchProductDetails on Product {
         self.failed_requests += 1
         return None, time.time() - start_time, False
 
+    async def on_rate_limited(self):
+        """Back off concurrency by one slot after a 429."""
+        self._success_streak = 0
+        if self.limiter and self.limiter.cap > 1:
+            await self.limiter.set_cap(self.limiter.cap - 1)
+            logging.warning(f"📉 Lowering concurrency to {self.limiter.cap}")
+
+    async def on_request_success(self):
+        """Restore concurrency one slot at a time after a streak of successful requests."""
+        self._success_streak += 1
+        if self.limiter and self._success_streak >= CONCURRENCY_RECOVERY_STREAK and self.limiter.cap < self.limiter.max_cap:
+            self._success_streak = 0
+            await self.limiter.set_cap(self.limiter.cap + 1)
+            logging.info(f"📈 Raising concurrency to {self.limiter.cap}")
+
     async def adapt_batch_size(self, success_rate: float):
         """OPTIMIZATION: Dynamic batch size adaptation."""
         if success_rate >= 0.95:  # Very high success rate
@@ -546,100 +1098,183 @@ fragment SearchProductDetails on Product {
             self.current_batch_size = max(FALLBACK_BATCH_SIZE, self.current_batch_size - 20)
             logging.warning(f"📉 Decreasing batch size to {self.current_batch_size} (success rate: {success_rate:.1%})")
 
-    async def scrape_category(self, session: aiohttp.ClientSession, category: Dict, semaphore: asyncio.Semaphore) -> int:
-        """OPTIMIZED: Scrape products from category with deep pagination."""
-        async with semaphore:
-            category_url = category['friendlyUrl']
-            category_name = category.get('name', category_url)
-            total_products = 0
-            offset = 0
-            consecutive_empty_pages = 0
-            max_empty_pages = 5  # Increased tolerance for empty pages
-            
-            logging.info(f"🛒 Processing {category_name} (batch size: {self.current_batch_size})")
-            
-            while not self.shutdown_requested and consecutive_empty_pages < max_empty_pages:
-                query = self.get_products_query(category_url, offset=offset)
-                response_data, duration, success = await self.make_graphql_request(session, query)
-                
-                if not success or not response_data:
-                    logging.warning(f"⚠️ Failed to fetch products from {category_name} at offset {offset}")
-                    consecutive_empty_pages += 1
-                    offset += self.current_batch_size  # Move forward even on failure
-                    continue
-                
-                search_results = response_data.get('searchProducts', {})
-                products = search_results.get('products', [])
-                
-                if not products:
-                    consecutive_empty_pages += 1
-                    logging.info(f"⚠️ Empty page in {category_name} at offset {offset} ({consecutive_empty_pages}/{max_empty_pages})")
-                    offset += self.current_batch_size
-                    continue
-                else:
-                    consecutive_empty_pages = 0  # Reset counter on successful page
-                
-                # Process products
-                new_products = []
-                for product_data in products:
-                    if product_data.get('id'):
-                        product_id = product_data['id']
-                        if product_id not in self.scraped_products:
-                            self.scraped_products.add(product_id)
-                            
-                            # FIXED: Capture ALL product data instead of selective fields
-                            formatted_product = {
-                                "product": product_data,  # Complete product data with all fields
-                                "scraped_from_category": category_name,
-                                "scraped_at": get_amsterdam_time().isoformat(),
-                                "optimization_version": "phase2b_complete_data"
-                            }
-                            new_products.append(formatted_product)
-                
-                if new_products:
-                    self.save_products(new_products)
-                    total_products += len(new_products)
-                    self.total_scraped += len(new_products)
-                
-                # Check max_products limit if set
-                if self.max_products and self.total_scraped >= self.max_products:
-                    logging.info(f"🎯 Reached max_products limit: {self.max_products} (scraped: {self.total_scraped})")
-                    break
-                
-                # DEEP PAGINATION: Use actual product count, not batch size
-                products_in_batch = len(products)
-                current_rate = products_in_batch / duration if duration > 0 else 0
-                
-                # Log every 100 products for deeper pagination visibility
-                if offset % 1000 == 0 or products_in_batch > 0:
-                    logging.info(f"⚡ {category_name}: +{products_in_batch} products at offset {offset} ({current_rate:.1f} products/sec)")
-                
-                # Update progress with enhanced metrics
-                progress_percent = min(100, (self.total_scraped / self.estimated_total_products) * 100)
-                elapsed_time = time.time() - self.start_time
-                overall_rate = self.total_scraped / elapsed_time if elapsed_time > 0 else 0
-                
-                update_progress('jumbo', 
-                              progress_percent=progress_percent, 
-                              products_scraped=self.total_scraped,
-                              current_task=f"{category_name} (offset {offset}) - {overall_rate:.1f} products/sec")
-                
-                # Save progress more frequently for deep pagination
-                if offset % 500 == 0:  # Every 500 products
-                    self.save_progress(offset)
-                
-                # CRITICAL: Use actual products returned length, not batch size
-                # This allows proper deep pagination beyond initial results
-                offset += len(products) if len(products) > 0 else self.current_batch_size
-                
-                # OPTIMIZATION: Respectful delay with adaptive rate
-                await asyncio.sleep(self.base_delay + uniform(0, 0.1))
+    async def fetch_products_page(self, category_url: str, offset: int, limiter: DynamicLimiter) -> Tuple[Optional[Dict], float, bool]:
+        """Fetch a single products page under the shared concurrency limit."""
+        async with limiter:
+            query = self.get_products_query(category_url, offset=offset)
+            return await self.make_graphql_request(query)
+
+    async def fetch_products_batch(self, category_url: str, offsets: List[int], limiter: DynamicLimiter) -> List[Tuple[Optional[Dict], float, bool]]:
+        """Fetch several offset pages in one aliased GraphQL request.
+        
+        Results are returned per offset in the same shape as fetch_products_page. Falls back
+        to single-offset requests if the API rejects batched queries with HTTP 413/422, and
+        retries a failed batch offset by offset so one failure does not count as several empty pages.
+        """
+        if self.batch_queries_enabled and len(offsets) > 1:
+            async with limiter:
+                query = self.get_products_query_batch(category_url, offsets)
+                try:
+                    response_data, duration, success = await self.make_graphql_request(
+                        query, reject_statuses=(413, 422))
+                    if success and response_data:
+                        return [({'searchProducts': response_data.get(f"p{i}") or {}}, duration, True)
+                                for i in range(len(offsets))]
+                    logging.warning(f"⚠️ Batched query failed, retrying its {len(offsets)} offsets individually")
+                except BatchQueryRejected as e:
+                    logging.warning(f"⚠️ Batched query rejected (HTTP {e.status}), falling back to single-offset requests")
+                    self.batch_queries_enabled = False
+        
+        return await asyncio.gather(*(
+            self.fetch_products_page(category_url, offset, limiter)
+            for offset in offsets
+        ))
+
+    async def stream_pages(self, category_url: str, offsets: List[int], limiter: DynamicLimiter):
+        """Yield (offset, page) in offset order as soon as each batch arrives.
+        
+        Batches are requested concurrently, but earlier pages are handed to the caller
+        while later ones are still in flight; unfinished requests are cancelled on close.
+        """
+        offset_groups = [offsets[i:i + QUERY_BATCH_SIZE] for i in range(0, len(offsets), QUERY_BATCH_SIZE)]
+        tasks = [asyncio.create_task(self.fetch_products_batch(category_url, group, limiter))
+                 for group in offset_groups]
+        try:
+            for group, task in zip(offset_groups, tasks):
+                for page in zip(group, await task):
+                    yield page
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def scrape_category(self, category: Dict, limiter: Optional[DynamicLimiter] = None) -> int:
+        """OPTIMIZED: Scrape products from category with deep pagination.
+        
+        After the first page reveals the page size, PAGINATION_WINDOW batched requests of
+        QUERY_BATCH_SIZE offsets each are issued in parallel and processed in offset order
+        as they arrive. The first short or empty page ends the category; requests still
+        in flight for later offsets are cancelled.
+        """
+        if limiter is None:
+            # Direct calls (e.g. partial catch-up jobs) share the scraper-wide limiter
+            if self.limiter is None:
+                self.limiter = DynamicLimiter(MAX_CONCURRENT_REQUESTS)
+            limiter = self.limiter
+        category_url = category['friendlyUrl']
+        category_name = category.get('name', category_url)
+        shard = re.sub(r'[^A-Za-z0-9_-]+', '_', category_url)
+        total_products = 0
+        offset = 0
+        page_size = None
+        consecutive_empty_pages = 0
+        max_empty_pages = 5  # Increased tolerance for empty pages
+        limit_reached = False
+        end_reached = False
+        
+        logging.info(f"🛒 Processing {category_name} (batch size: {self.current_batch_size})")
+        
+        while (not self.shutdown_requested and not limit_reached and not end_reached
+               and consecutive_empty_pages < max_empty_pages):
+            stride = page_size or self.current_batch_size
+            window = PAGINATION_WINDOW * QUERY_BATCH_SIZE if page_size else 1  # Learn the page size first
+            offsets = [offset + i * stride for i in range(window)]
             
-            # Final save
-            self.save_progress(offset)
-            logging.info(f"✅ Completed {category_name}: {total_products} products total (final offset: {offset})")
+            async with aclosing(self.stream_pages(category_url, offsets, limiter)) as pages:
+                async for page_offset, (response_data, duration, success) in pages:
+                    if not success or not response_data:
+                        logging.warning(f"⚠️ Failed to fetch products from {category_name} at offset {page_offset}")
+                        consecutive_empty_pages += 1
+                        continue
+                    
+                    search_results = response_data.get('searchProducts', {})
+                    products = search_results.get('products', [])
+                    
+                    if not products:
+                        if page_size is not None:
+                            # Past the last page: skip the rest of this window
+                            end_reached = True
+                            offset = page_offset
+                            break
+                        consecutive_empty_pages += 1
+                        logging.info(f"⚠️ Empty page in {category_name} at offset {page_offset} ({consecutive_empty_pages}/{max_empty_pages})")
+                        continue
+                    else:
+                        consecutive_empty_pages = 0  # Reset counter on successful page
+                    
+                    # CRITICAL: Use actual products returned length, not batch size
+                    # This allows proper deep pagination beyond initial results
+                    if page_size is None:
+                        page_size = len(products)
+                    
+                    # Dedup the whole page with one set difference; skip building rows when nothing is new
+                    new_ids = {product_data.get('id') for product_data in products} - self.scraped_products
+                    new_ids.discard(None)
+                    new_products = []
+                    if new_ids:
+                        self.scraped_products |= new_ids
+                        scraped_at = get_amsterdam_time().isoformat()  # One timestamp per page
+                        for product_data in products:
+                            product_id = product_data.get('id')
+                            if product_id in new_ids:
+                                new_ids.discard(product_id)  # Keep the first occurrence within the page
+                                
+                                # FIXED: Capture ALL product data instead of selective fields
+                                new_products.append({
+                                    "product": product_data,  # Complete product data with all fields
+                                    "scraped_from_category": category_name,
+                                    "scraped_at": scraped_at,
+                                    "optimization_version": self.optimization_version
+                                })
+                    
+                    if new_products:
+                        await self.save_products(new_products, shard)
+                        total_products += len(new_products)
+                        self.total_scraped += len(new_products)
+                    
+                    # Check max_products limit if set
+                    if self.max_products and self.total_scraped >= self.max_products:
+                        logging.info(f"🎯 Reached max_products limit: {self.max_products} (scraped: {self.total_scraped})")
+                        limit_reached = True
+                        break
+                    
+                    # DEEP PAGINATION: Use actual product count, not batch size
+                    products_in_batch = len(products)
+                    current_rate = products_in_batch / duration if duration > 0 else 0
+                    
+                    # Log every 100 products for deeper pagination visibility
+                    if page_offset % 1000 == 0 or products_in_batch > 0:
+                        logging.info(f"⚡ {category_name}: +{products_in_batch} products at offset {page_offset} ({current_rate:.1f} products/sec)")
+                    
+                    # Update progress with enhanced metrics
+                    progress_percent = min(100, (self.total_scraped / self.estimated_total_products) * 100)
+                    elapsed_time = time.time() - self.start_time
+                    overall_rate = self.total_scraped / elapsed_time if elapsed_time > 0 else 0
+                    
+                    # In-memory only; live_progress_loop() writes the latest snapshot
+                    self.live_progress = dict(
+                        progress_percent=progress_percent,
+                        products_scraped=self.total_scraped,
+                        current_task=f"{category_name} (offset {page_offset}) - {overall_rate:.1f} products/sec"
+                    )
+                    
+                    # Cursor for the periodic checkpoint task
+                    self.current_offset = page_offset
+                    
+                    # A short page is the category's last one
+                    if products_in_batch < page_size:
+                        end_reached = True
+                        offset = page_offset + products_in_batch
+                        break
             
-            return total_products
+            if not end_reached:
+                offset = offsets[-1] + (page_size or stride)
+        
+        # Final cursor; persisted by the checkpoint task / end of run
+        self.current_offset = offset
+        logging.info(f"✅ Completed {category_name}: {total_products} products total (final offset: {offset})")
+        
+        return total_products
 
     async def run(self):
         """OPTIMIZED: Main scraping method with full catalog processing."""
@@ -652,22 +1287,23 @@ fragment SearchProductDetails on Product {
         # Performance tracking
         scraping_start_time = time.time()
         
-        connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT_REQUESTS * 2, limit_per_host=MAX_CONCURRENT_REQUESTS)
-        async with aiohttp.ClientSession(
-            timeout=self.timeout_config,
-            connector=connector,
-            cookies=self.session_cookies
-        ) as session:
+        # Reuses the caller's session if the scraper is already entered
+        async with self:
+            os.makedirs(self.products_shard_dir, exist_ok=True)
+            await asyncio.to_thread(self.import_legacy_products)
+            stop_writers = asyncio.Event()
+            checkpoint_task = asyncio.create_task(self.checkpoint_loop(CHECKPOINT_INTERVAL, stop_writers))
+            live_progress_task = asyncio.create_task(self.live_progress_loop(LIVE_PROGRESS_INTERVAL, stop_writers))
             
             try:
                 # Save session at start
-                self.save_session(session)
+                await self.save_session()
                 
                 update_status('jumbo', ScraperStatus.RUNNING, "Fetching categories via GraphQL")
                 
                 # Fetch categories
                 categories_query = self.get_categories_query()
-                categories_data, duration, success = await self.make_graphql_request(session, categories_query)
+                categories_data, duration, success = await self.make_graphql_request(categories_query)
                 
                 if not success or not categories_data:
                     raise Exception("Failed to fetch categories")
@@ -675,22 +1311,35 @@ fragment SearchProductDetails on Product {
                 categories = categories_data.get('searchProducts', {}).get('categoryTiles', [])
                 logging.info(f"🎯 Found {len(categories)} categories to process")
                 
-                # FOCUS ON BBQ CATEGORY: This should return the full product catalog
-                logging.info(f"🎯 Using BBQ category for full catalog access (deep pagination)")
-                
-                # Use only BBQ category which is known to return full catalog
-                bbq_category = {"friendlyUrl": "bbq", "name": "BBQ (Full Catalog)"}
-                
-                update_status('jumbo', ScraperStatus.RUNNING, 
-                             f"Deep scraping BBQ category with {self.current_batch_size}-product batches")
+                # Shared, adaptive limit for in-flight page requests across all categories
+                limiter = self.limiter = DynamicLimiter(MAX_CONCURRENT_REQUESTS)
                 
-                # OPTIMIZATION: Focus all effort on deep BBQ pagination
-                semaphore = asyncio.Semaphore(1)  # Single category, full focus
-                
-                logging.info(f"🚀 Starting deep pagination of BBQ category...")
-                total_bbq_products = await self.scrape_category(session, bbq_category, semaphore)
-                
-                logging.info(f"✅ BBQ deep scraping complete: {total_bbq_products} products discovered")
+                if self.categories_limit:
+                    # Explicit category selection: fan out over the first N categories
+                    selected_categories = [c for c in categories if c.get('friendlyUrl')][:self.categories_limit]
+                    update_status('jumbo', ScraperStatus.RUNNING, 
+                                 f"Scraping {len(selected_categories)} categories concurrently")
+                    
+                    logging.info(f"🚀 Starting concurrent pagination of {len(selected_categories)} categories...")
+                    category_totals = await asyncio.gather(*(
+                        self.scrape_category(category, limiter) for category in selected_categories
+                    ))
+                    logging.info(f"✅ Category scraping complete: {sum(category_totals)} products discovered")
+                else:
+                    # FOCUS ON BBQ CATEGORY: This should return the full product catalog
+                    logging.info(f"🎯 Using BBQ category for full catalog access (deep pagination)")
+                    
+                    # Use only BBQ category which is known to return full catalog
+                    bbq_category = {"friendlyUrl": "bbq", "name": "BBQ (Full Catalog)"}
+                    
+                    update_status('jumbo', ScraperStatus.RUNNING, 
+                                 f"Deep scraping BBQ category with {self.current_batch_size}-product batches")
+                    
+                    # OPTIMIZATION: Parallel offset windows within the single full-catalog category
+                    logging.info(f"🚀 Starting deep pagination of BBQ category...")
+                    total_bbq_products = await self.scrape_category(bbq_category, limiter)
+                    
+                    logging.info(f"✅ BBQ deep scraping complete: {total_bbq_products} products discovered")
                 
                 # Final performance report
                 total_duration = time.time() - scraping_start_time
@@ -701,6 +1350,9 @@ fragment SearchProductDetails on Product {
                 logging.info(f"   Total time: {total_duration:.2f} seconds ({total_duration/60:.1f} minutes)")
                 logging.info(f"   Final rate: {final_rate:.1f} products/second")
                 logging.info(f"   Deep pagination: BBQ category with {self.current_batch_size}-product batches")
+                total_requests = self.successful_requests + self.failed_requests
+                logging.info(f"   Response payload ({self.detail_level}): {self.response_bytes / 1024 / 1024:.1f} MB "
+                             f"({self.response_bytes / 1024 / max(1, total_requests):.1f} KB/request)")
                 logging.info(f"   Success rate: {self.successful_requests}/{self.successful_requests + self.failed_requests} ({self.successful_requests/(self.successful_requests + self.failed_requests)*100:.1f}%)")
                 
                 # Calculate improvement vs original
@@ -731,16 +1383,34 @@ fragment SearchProductDetails on Product {
                 update_status('jumbo', ScraperStatus.FAILED, f"Error: {str(e)}")
                 raise
             finally:
-                self.save_progress()
+                # Let in-flight writes land first; they share the final save's files
+                stop_writers.set()
+                await asyncio.gather(checkpoint_task, live_progress_task, return_exceptions=True)
+                try:
+                    await self.flush_live_progress()
+                    await self.save_progress()
+                except Exception as e:
+                    logging.warning(f"⚠️ Failed to save final progress: {e}")
+                self.compacted_products = await asyncio.to_thread(self.compact_to_json)
 
 async def main():
     """Main function to run the optimized Jumbo scraper."""
     logging.info("🚀 Starting Jumbo GraphQL Optimized Scraper (Phase 2A)")
     
-    scraper = JumboGraphQLOptimizedScraper()
+    parser = argparse.ArgumentParser(description="Jumbo GraphQL Optimized Scraper")
+    parser.add_argument("--full", action="store_true", help="Fetch the full product fragment instead of core fields")
+    args = parser.parse_args()
+    
+    scraper = JumboGraphQLOptimizedScraper(full_details=args.full)
     await scraper.run()
     
     logging.info("✅ Scraper execution completed")
 
+def run_event_loop(coro):
+    """Run coro on uvloop when installed, otherwise on the default asyncio loop."""
+    if uvloop is not None:
+        return uvloop.run(coro)
+    return asyncio.run(coro)
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run_event_loop(main())
\ No newline at end of file
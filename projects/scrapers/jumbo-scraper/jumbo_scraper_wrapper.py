@@ -7,9 +7,12 @@ WITHOUT modifying the core scraping logic
 
 import json
 import sys
-import os
 import argparse
+import asyncio
+import contextvars
 import logging
+import logging.handlers
+import queue
 from pathlib import Path
 
 # Add current directory to Python path for imports
@@ -50,13 +53,102 @@ except ImportError:
         return "/app/results"
 
 # Import the original scraper
-from jumbo_scraper import JumboGraphQLOptimizedScraper
+from jumbo_scraper import JumboGraphQLOptimizedScraper, run_event_loop
+
+# Job log buffering: records are written in batches, ERROR and above immediately
+LOG_BUFFER_CAPACITY = 1024
+LOG_FLUSH_INTERVAL = 30  # seconds
+
+def buffered_file_handler(log_file, formatter):
+    """FileHandler wrapped in a MemoryHandler so tight scrape loops don't write per record"""
+    raw_handler = logging.FileHandler(log_file)
+    raw_handler.setLevel(logging.INFO)
+    raw_handler.setFormatter(formatter)
+    handler = logging.handlers.MemoryHandler(
+        capacity=LOG_BUFFER_CAPACITY,
+        flushLevel=logging.ERROR,
+        target=raw_handler
+    )
+    handler.setLevel(logging.INFO)
+    return handler
+
+def close_buffered_handler(handler):
+    """Flush and close a buffered handler together with its file handler"""
+    target = handler.target
+    handler.close()  # flushes the buffer
+    if target is not None:
+        target.close()
+
+async def flush_log_periodically(handler, interval=LOG_FLUSH_INTERVAL):
+    """Flush buffered log records every `interval` seconds so job logs stay reasonably fresh"""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(handler.flush)
+
+def start_log_listener(*handlers):
+    """
+    Route records through a queue to a listener thread that owns the real handlers,
+    so formatting and disk writes happen off the event loop.
+    Returns the QueueHandler to attach and the started QueueListener.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return logging.handlers.QueueHandler(log_queue), listener
+
+# Job whose code is currently logging; lets in-process jobs share the root logger
+current_job_id = contextvars.ContextVar("current_job_id", default=None)
+
+class JobLogFilter(logging.Filter):
+    """Only pass records emitted from within the given job's asyncio task"""
+    
+    def __init__(self, job_id):
+        super().__init__()
+        self.job_id = job_id
+    
+    def filter(self, record):
+        return current_job_id.get() == self.job_id
+
+class JobLogHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler for one in-process job: records are filtered by job on the event loop
+    and written by a listener thread that owns the job's buffered file handler.
+    """
+    
+    def __init__(self, job_config):
+        super().__init__(queue.SimpleQueue())
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+        self.file_handler = buffered_file_handler(job_config["log_file"], formatter)
+        self.listener = logging.handlers.QueueListener(self.queue, self.file_handler, respect_handler_level=True)
+        self.addFilter(JobLogFilter(job_config["job_id"]))
+        self.listener.start()
+    
+    def flush(self):
+        self.file_handler.flush()
+    
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()  # drains the queue
+            self.listener = None
+            close_buffered_handler(self.file_handler)
+        super().close()
+
+def add_job_log_handler(job_config):
+    """
+    Attach a job-specific log handler to the root logger without touching the host's handlers.
+    Call from the job's own task after setting current_job_id; remove and close it when done.
+    """
+    handler = JobLogHandler(job_config)
+    logging.getLogger().addHandler(handler)
+    return handler
 
 # Override the hardcoded paths in the scraper to work with our infrastructure
-def patch_scraper_for_infrastructure(scraper_instance, job_config):
+def patch_scraper_for_infrastructure(scraper_instance, job_config, configure_logging=True):
     """
     Patch the scraper instance to use infrastructure paths instead of hardcoded ones
     This maintains the core logic while adapting to container environment
+    
+    configure_logging=False leaves the root logger alone (in-process jobs use add_job_log_handler)
     """
     job_id = job_config["job_id"]
     
@@ -69,11 +161,10 @@ def patch_scraper_for_infrastructure(scraper_instance, job_config):
     # Update session and data directories to work in container
     scraper_instance.session_file = f"/app/shared-data/{job_id}_session.json"
     
-    # Create necessary directories
-    os.makedirs("/app/results", exist_ok=True)
-    os.makedirs("/app/jobs", exist_ok=True)
-    os.makedirs("/app/logs", exist_ok=True)
-    os.makedirs("/app/shared-data", exist_ok=True)
+    # Directories already exist: the image creates them and the API lifespan hook ensures them
+    
+    if not configure_logging:
+        return scraper_instance
     
     # Override the hardcoded log configuration to use job-specific log
     log_file = job_config["log_file"]
@@ -82,23 +173,26 @@ def patch_scraper_for_infrastructure(scraper_instance, job_config):
     logger = logging.getLogger()
     logger.handlers.clear()
     
-    # Add file handler for this specific job
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(logging.INFO)
+    # Set format
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    
+    # Add (buffered) file handler for this specific job
+    file_handler = buffered_file_handler(log_file, formatter)
     
     # Add console handler  
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    
-    # Set format
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
     
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Both handlers run on a listener thread; the scraper only enqueues records
+    queue_handler, listener = start_log_listener(file_handler, console_handler)
+    logger.addHandler(queue_handler)
     logger.setLevel(logging.INFO)
     
+    # main() flushes periodically and stops the listener (draining the queue) at the end
+    scraper_instance.log_handler = file_handler
+    scraper_instance.log_listener = listener
+    
     # Job-specific parameters are now passed via constructor
     # No need to patch them here anymore
     
@@ -122,12 +216,19 @@ async def main():
         # Create and patch the scraper instance with job parameters
         scraper = JumboGraphQLOptimizedScraper(
             max_products=job_config.get('max_products'),
-            categories_limit=job_config.get('categories_limit')
+            categories_limit=job_config.get('categories_limit'),
+            full_details=job_config.get('full_details', False)
         )
         scraper = patch_scraper_for_infrastructure(scraper, job_config)
         
-        # Run the scraper
-        await scraper.run()
+        # Run the scraper, flushing the buffered job log while it works
+        flush_task = asyncio.create_task(flush_log_periodically(scraper.log_handler))
+        try:
+            await scraper.run()
+        finally:
+            flush_task.cancel()
+            scraper.log_listener.stop()
+            scraper.log_handler.flush()
         
         print(f"✅ Jumbo scraper completed for job {job_config['job_id']}")
         
@@ -136,5 +237,4 @@ async def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
\ No newline at end of file
+    run_event_loop(main())
\ No newline at end of file
@@ -62,8 +62,11 @@ def update_progress(scraper_name: str, **kwargs):
         progress_file = f"/app/jobs/{scraper_name}_live_progress.json"
         os.makedirs(os.path.dirname(progress_file), exist_ok=True)
         
-        with open(progress_file, "w") as f:
+        # Write-then-rename so readers never see a partially written file
+        tmp_file = f"{progress_file}.tmp"
+        with open(tmp_file, "w") as f:
             json.dump(progress_data, f, indent=2)
+        os.replace(tmp_file, progress_file)
         
         # Log key progress metrics
         if 'progress_percent' in kwargs:
@@ -5,43 +5,185 @@ Wraps the sophisticated Jumbo scraper with a modern REST API
 Designed for Docker container deployment with N8N integration
 """
 
-from fastapi import FastAPI, BackgroundTasks, HTTPException, Query, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Query, Depends, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, List, Any, Union
 import asyncio
 import json
 import os
-import subprocess
+import sqlite3
 import time
-import threading
 import uuid
 import logging
+import logging.handlers
+import queue
+from collections import defaultdict
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 from pathlib import Path
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("/app/logs/api.log"),
-        logging.StreamHandler()
-    ]
+import aiohttp
+import uvicorn
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import aiofiles
+except ImportError:
+    aiofiles = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+class ApiLogFilter(logging.Filter):
+    """Keep scraper records logged from inside a job out of api.log; they go to the job's own log"""
+    
+    def filter(self, record):
+        return current_job_id.get() is None or record.name == logger.name
+
+# Setup logging: handlers only enqueue records, a background listener thread does the writes
+log_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+log_file_handler = logging.FileHandler("/app/logs/api.log")
+log_file_handler.setFormatter(log_formatter)
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(log_formatter)
+
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(
+    log_queue, log_file_handler, log_stream_handler, respect_handler_level=True
 )
+log_listener.start()
+
+api_log_handler = logging.handlers.QueueHandler(log_queue)
+api_log_handler.setFormatter(logging.Formatter("%(message)s"))  # full format is applied by the listener's handlers
+api_log_handler.addFilter(ApiLogFilter())
+logging.basicConfig(level=logging.INFO, handlers=[api_log_handler])
 logger = logging.getLogger(__name__)
 
+# Imported after logging is configured: jumbo_scraper calls logging.basicConfig at import
+# time, which would otherwise claim the root logger and silence /app/logs/api.log
+from jumbo_scraper import JumboGraphQLOptimizedScraper, json_loads, json_dumps_str, read_file_async, write_file_async
+from jumbo_scraper_wrapper import (
+    patch_scraper_for_infrastructure, add_job_log_handler, flush_log_periodically, current_job_id
+)
+
+# Responses serialize with orjson when it is installed
+FastJSONResponse = ORJSONResponse if orjson else JSONResponse
+
+def json_dumps_bytes(obj) -> bytes:
+    """Serialize obj as compact JSON bytes"""
+    return orjson.dumps(obj) if orjson else json.dumps(obj).encode('utf-8')
+
+def json_dumps_pretty(obj) -> bytes:
+    """Serialize obj as indented JSON bytes (for files meant to be read by people)"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2).encode('utf-8')
+
+WEBHOOK_HEADERS = {"Content-Type": "application/json"}
+
+# Chunk size used when streaming result files to clients
+RESULTS_CHUNK_SIZE = 1024 * 1024
+# Initial bytes-per-line guess when reading only the tail of a log file
+LOG_TAIL_LINE_BYTES = 256
+
+# Job persistence: every job is stored in SQLite; finished jobs expire after JOB_TTL_SECONDS
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "/app/jobs/state.db")
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+JOB_PURGE_INTERVAL = 3600  # seconds
+ACTIVE_STATUSES = ("queued", "running")
+
+class JobStore:
+    """SQLite (WAL) backed job records, so finished jobs don't accumulate in memory"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.conn: Optional[sqlite3.Connection] = None
+    
+    def open(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at TEXT,"
+            " updated_at REAL NOT NULL, data TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+    
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+    
+    def save(self, job: Dict[str, Any]):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, status, created_at, updated_at, data) VALUES (?, ?, ?, ?, ?)",
+            (job["job_id"], job["status"], job.get("created_at"), time.time(), json_dumps_str(job))
+        )
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json_loads(row[0]) if row else None
+    
+    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        if status:
+            rows = self.conn.execute("SELECT data FROM jobs WHERE status = ? ORDER BY created_at", (status,))
+        else:
+            rows = self.conn.execute("SELECT data FROM jobs ORDER BY created_at")
+        return [json_loads(data) for (data,) in rows]
+    
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+    
+    def count_by_status(self) -> Dict[str, int]:
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+    
+    def fail_interrupted(self) -> int:
+        """Mark jobs left queued/running by a previous process as failed"""
+        interrupted = 0
+        for job in self.list("queued") + self.list("running"):
+            job.update(status="failed", completed_at=utc_now_iso(), error="Interrupted by service restart")
+            self.save(job)
+            interrupted += 1
+        return interrupted
+    
+    def purge_expired(self, ttl_seconds: int) -> int:
+        """Delete finished jobs not updated within ttl_seconds"""
+        cursor = self.conn.execute(
+            f"DELETE FROM jobs WHERE updated_at < ? AND status NOT IN {ACTIVE_STATUSES}",
+            (time.time() - ttl_seconds,)
+        )
+        return cursor.rowcount
+
 # Global state management
-scraper_jobs: Dict[str, Dict] = {}
-active_processes: Dict[str, subprocess.Popen] = {}
+job_store = JobStore(JOB_DB_PATH)
+scraper_jobs: Dict[str, Dict] = {}  # Active (queued/running) jobs only; everything is also in job_store
+active_tasks: Dict[str, asyncio.Task] = {}
+# Jobs DELETE /jobs/{id} has been called for; run_scraper_job checks this between its awaits
+cancel_requested: set = set()
+# Active job ids per status, kept in sync by set_status()
+jobs_by_status: Dict[str, set] = defaultdict(set)
+# Parsed progress files keyed by path -> (st_mtime_ns, data); re-read only when the file changes
+_progress_cache: Dict[str, tuple] = {}
 MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "3"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "20"))
+# Jobs beyond MAX_CONCURRENT_JOBS wait here (status 'queued') until a slot frees
+job_slots = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
 
 # Pydantic models for API
 class ScrapingRequest(BaseModel):
     max_products: Optional[int] = Field(default=None, ge=0)  # None = unlimited
     categories_limit: Optional[int] = Field(default=None, ge=0)  # None = unlimited
+    full_details: bool = False  # Fetch every product field instead of the core set
     webhook_url: Optional[str] = None
     notify_on_complete: bool = True
     priority: Optional[str] = Field(default="normal", pattern="^(low|normal|high)$")
@@ -74,29 +216,46 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Starting Jumbo Scraper API Service...")
     
     # Create necessary directories
-    os.makedirs("/app/jobs", exist_ok=True)
-    os.makedirs("/app/results", exist_ok=True)
-    os.makedirs("/app/logs", exist_ok=True)
-    os.makedirs("/app/shared-data", exist_ok=True)
+    for directory in ("/app/jobs", "/app/results", "/app/logs", "/app/shared-data"):
+        await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+    
+    # Open the job store; jobs a previous process left active can no longer finish
+    await asyncio.to_thread(job_store.open)
+    interrupted = await asyncio.to_thread(job_store.fail_interrupted)
+    if interrupted:
+        logger.warning(f"⚠️ Marked {interrupted} interrupted job(s) from a previous run as failed")
+    purge_task = asyncio.create_task(purge_expired_jobs_periodically())
     
     # Record startup time
     app.state.startup_time = time.time()
     
+    # One pooled HTTP session for all webhook notifications
+    app.state.http = aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=30),
+        connector=aiohttp.TCPConnector(limit=100, limit_per_host=10, keepalive_timeout=60),
+        json_serialize=json_dumps_str
+    )
+    
     logger.info("✅ Jumbo Scraper API Service started successfully")
     yield
     
     # Shutdown
     logger.info("🛑 Shutting down scraper service...")
     
-    # Clean up any running processes
-    for job_id, process in active_processes.items():
-        try:
-            process.terminate()
-            logger.info(f"Terminated job {job_id}")
-        except Exception as e:
-            logger.error(f"Error terminating job {job_id}: {e}")
+    # Cancel running scraper tasks and let them checkpoint progress
+    tasks = list(active_tasks.items())
+    for job_id, task in tasks:
+        task.cancel()
+        logger.info(f"Cancelled job {job_id}")
+    if tasks:
+        await asyncio.wait([task for _, task in tasks], timeout=10)
+    
+    await app.state.http.close()
+    purge_task.cancel()
+    await asyncio.to_thread(job_store.close)
     
     logger.info("✅ Shutdown complete")
+    log_listener.stop()
 
 # Create FastAPI app
 app = FastAPI(
@@ -105,6 +264,7 @@ app = FastAPI(
     version="2.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=FastJSONResponse,
     lifespan=lifespan
 )
 
@@ -117,152 +277,292 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def run_scraper_subprocess(job_id: str, config: ScrapingRequest):
-    """Run the Jumbo scraper as subprocess with job-specific config"""
+def utc_now_iso() -> str:
+    """Current UTC time as an ISO string (job timestamps are stored serialized)"""
+    return datetime.now(timezone.utc).isoformat()
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Look up a job: active jobs from memory, finished ones from the job store"""
+    job = scraper_jobs.get(job_id)
+    if job is None:
+        job = await asyncio.to_thread(job_store.get, job_id)
+    return job
+
+async def save_job(job: Dict[str, Any]):
+    """Persist a job record in a worker thread (a snapshot, so the loop can keep updating it)"""
+    await asyncio.to_thread(job_store.save, dict(job))
+
+async def set_status(job_id: str, status: str, **fields):
+    """Update and persist a job's status (and any extra fields); finished jobs leave memory"""
+    job = await get_job(job_id)
+    jobs_by_status[job.get("status")].discard(job_id)
+    job.update(fields, status=status)
+    if status in ACTIVE_STATUSES:
+        jobs_by_status[status].add(job_id)
+        scraper_jobs[job_id] = job
+    await save_job(job)
+    if status not in ACTIVE_STATUSES:
+        # Only dropped once stored, so lookups meanwhile still find it in memory
+        scraper_jobs.pop(job_id, None)
+
+async def purge_expired_jobs_periodically():
+    """Drop finished jobs older than JOB_TTL_SECONDS from the store"""
+    while True:
+        purged = await asyncio.to_thread(job_store.purge_expired, JOB_TTL_SECONDS)
+        if purged:
+            logger.info(f"🧹 Purged {purged} expired job(s)")
+        await asyncio.sleep(JOB_PURGE_INTERVAL)
+
+async def mark_cancelled(job_id: str):
+    """Record a job as cancelled, keeping a cancel time/reason already set by cancel_job"""
+    job = await get_job(job_id)
+    await set_status(
+        job_id, "cancelled",
+        completed_at=job.get("completed_at") or utc_now_iso(),
+        error=job.get("error") or "Job cancelled"
+    )
+
+async def run_scraper_job(job_id: str, config: ScrapingRequest):
+    """Run the Jumbo scraper in-process as an asyncio task with job-specific config"""
     
-    try:
-        # Create job-specific config file
-        job_config = {
-            "job_id": job_id,
-            "max_products": config.max_products,
-            "categories_limit": config.categories_limit,
-            "output_file": f"/app/results/{job_id}_products.json",
-            "progress_file": f"/app/jobs/{job_id}_progress.json",
-            "complete_flag": f"/app/jobs/{job_id}_complete.flag",
-            "log_file": f"/app/logs/{job_id}.log",
-            "webhook_url": config.webhook_url
-        }
-        
-        config_file_path = f"/app/jobs/{job_id}_config.json"
-        with open(config_file_path, "w") as f:
-            json.dump(job_config, f, indent=2)
-        
-        # Update job status
-        scraper_jobs[job_id].update({
-            "status": "running",
-            "started_at": datetime.now(timezone.utc),
-            "config": config.dict(),
-            "config_file": config_file_path
-        })
+    # Tag everything logged from this job (and the tasks it spawns) with its id
+    current_job_id.set(job_id)
+    log_handler = None
+    flush_task = None
+    
+    # Wait for a free slot; the job stays 'queued' until then
+    async with job_slots:
+        try:
+            if job_id in cancel_requested:
+                return
+            
+            # Create job-specific config file
+            job_config = {
+                "job_id": job_id,
+                "max_products": config.max_products,
+                "categories_limit": config.categories_limit,
+                "full_details": config.full_details,
+                "output_file": f"/app/results/{job_id}_products.json",
+                "progress_file": f"/app/jobs/{job_id}_progress.json",
+                "complete_flag": f"/app/jobs/{job_id}_complete.flag",
+                "log_file": f"/app/logs/{job_id}.log",
+                "webhook_url": config.webhook_url
+            }
         
-        logger.info(f"Starting Jumbo scraper subprocess for job {job_id}")
+            config_file_path = f"/app/jobs/{job_id}_config.json"
+            await write_file_async(config_file_path, json_dumps_pretty(job_config))
+            if job_id in cancel_requested:
+                return
         
-        # Run the Jumbo scraper wrapper with job-specific parameters
-        process = subprocess.Popen([
-            "python", "/app/jumbo_scraper_wrapper.py", 
-            "--config", config_file_path
-        ], 
-        cwd="/app", 
-        stdout=subprocess.PIPE, 
-        stderr=subprocess.STDOUT, 
-        text=True,
-        bufsize=1,
-        universal_newlines=True
-        )
+            # Update job status
+            await set_status(
+                job_id, "running",
+                started_at=utc_now_iso(),
+                config=config.dict(),
+                config_file=config_file_path
+            )
+            if job_id in cancel_requested:
+                # cancel_job may have stored 'cancelled' before 'running' landed
+                await mark_cancelled(job_id)
+                return
         
-        active_processes[job_id] = process
+            logger.info(f"Starting Jumbo scraper task for job {job_id}")
+            log_handler = add_job_log_handler(job_config)
+            flush_task = asyncio.create_task(flush_log_periodically(log_handler))
         
-        # Monitor process output
-        log_file_path = f"/app/logs/{job_id}.log"
-        with open(log_file_path, "w") as log_file:
-            for line in process.stdout:
-                log_file.write(line)
-                log_file.flush()
+            # Run the Jumbo scraper in this event loop; the API process keeps ownership of signals
+            # (constructed in a worker thread: __init__ scans directories and loads saved state)
+            scraper = await asyncio.to_thread(
+                JumboGraphQLOptimizedScraper,
+                max_products=config.max_products,
+                categories_limit=config.categories_limit,
+                full_details=config.full_details,
+                install_signal_handlers=False
+            )
+            if job_id in cancel_requested:
+                await mark_cancelled(job_id)
+                return
+            patch_scraper_for_infrastructure(scraper, job_config, configure_logging=False)
+            task = asyncio.create_task(scraper.run())
+            active_tasks[job_id] = task
         
-        # Wait for completion
-        return_code = process.wait()
+            try:
+                await task
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    # The API itself is being cancelled; stop the scraper with it
+                    task.cancel()
+                    raise
+                await mark_cancelled(job_id)
+                logger.info(f"Job {job_id} cancelled")
+                return
         
-        if return_code == 0:
             # Success
-            scraper_jobs[job_id].update({
-                "status": "completed",
-                "completed_at": datetime.now(timezone.utc),
-                "output_file": f"/app/results/{job_id}_products.json"
-            })
-            
+            await set_status(
+                job_id, "completed",
+                completed_at=utc_now_iso(),
+                output_file=f"/app/results/{job_id}_products.json",
+                total_products=scraper.compacted_products
+            )
+        
             logger.info(f"Job {job_id} completed successfully")
-            
+        
             # Send webhook notification if configured
             if config.webhook_url and config.notify_on_complete:
-                asyncio.create_task(send_webhook_notification(job_id, config.webhook_url))
-                
-        else:
-            # Failure
-            scraper_jobs[job_id].update({
-                "status": "failed",
-                "completed_at": datetime.now(timezone.utc),
-                "error": f"Process failed with return code {return_code}",
-                "return_code": return_code
-            })
-            
-            logger.error(f"Job {job_id} failed with return code {return_code}")
+                await send_webhook_notification(job_id, config.webhook_url)
     
-    except Exception as e:
-        logger.error(f"Exception in job {job_id}: {e}")
-        scraper_jobs[job_id].update({
-            "status": "failed",
-            "completed_at": datetime.now(timezone.utc),
-            "error": str(e)
-        })
+        except Exception as e:
+            logger.error(f"Exception in job {job_id}: {e}")
+            await set_status(
+                job_id, "failed",
+                completed_at=utc_now_iso(),
+                error=str(e)
+            )
+    
+        finally:
+            # Clean up
+            active_tasks.pop(job_id, None)
+            cancel_requested.discard(job_id)
+            if flush_task is not None:
+                flush_task.cancel()
+            if log_handler is not None:
+                logging.getLogger().removeHandler(log_handler)
+                log_handler.close()
+            logger.info(f"Cleaned up job {job_id}")
+
+async def read_json_file(path: str):
+    """Load a JSON file without blocking the event loop"""
+    return json_loads(await read_file_async(path))
+
+def read_log_tail(log_file: str, tail: int) -> List[str]:
+    """Read the last `tail` lines by seeking back from the end, widening the window as needed"""
+    with open(log_file, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        window = min(size, max(8192, tail * LOG_TAIL_LINE_BYTES))
+        while True:
+            f.seek(size - window)
+            lines = f.read(window).splitlines(keepends=True)
+            if window < size:
+                lines = lines[1:]  # First line may start mid-way
+            if len(lines) >= tail or window == size:
+                break
+            window = min(size, window * 2)
+    return [line.decode('utf-8', errors='replace') for line in lines[-tail:]]
+
+async def load_progress_file(path: str) -> Optional[Dict[str, Any]]:
+    """Load a progress file, reusing the parsed copy while its mtime is unchanged (None if missing/invalid)"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        _progress_cache.pop(path, None)
+        return None
+    
+    cached = _progress_cache.get(path)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
     
-    finally:
-        # Clean up
-        if job_id in active_processes:
-            del active_processes[job_id]
-        logger.info(f"Cleaned up job {job_id}")
+    try:
+        data = await read_json_file(path)
+    except (ValueError, FileNotFoundError):
+        return None
+    _progress_cache[path] = (mtime_ns, data)
+    return data
+
+def progress_etag(path: str, prefix: str = "") -> Optional[str]:
+    """ETag for a progress file loaded via load_progress_file(), derived from its cached mtime"""
+    cached = _progress_cache.get(path)
+    return f'"{prefix}{cached[0]}"' if cached else None
+
+def progress_response(request: Request, etag: Optional[str], content: Dict[str, Any]):
+    """Answer 304 when the poller already has this version, otherwise the content tagged with its ETag"""
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    headers = {"ETag": etag} if etag else None
+    return FastJSONResponse(content, headers=headers)
+
+async def stream_results_envelope(job_id: str, results_file: str, total_products: int):
+    """Stream the results file inside the usual response envelope without parsing it"""
+    yield f'{{"job_id": {json_dumps_str(job_id)}, "total_products": {total_products}, "format": "full", "results": '.encode()
+    async with aiofiles.open(results_file, 'rb') as f:
+        while chunk := await f.read(RESULTS_CHUNK_SIZE):
+            yield chunk
+    yield b'}'
+
+async def read_result_items(results_file: str, limit: int, count_all: bool = False):
+    """
+    Incrementally parse the first `limit` products of a results array (and optionally count the rest).
+    Returns (items, count) or None when the file is not a JSON array or ijson/aiofiles are unavailable.
+    """
+    if ijson is None or aiofiles is None:
+        return None
+    
+    items = []
+    count = 0
+    async with aiofiles.open(results_file, 'rb') as f:
+        if not (await f.read(64)).lstrip().startswith(b'['):
+            return None
+        await f.seek(0)
+        async for item in ijson.items_async(f, 'item', use_float=True):
+            count += 1
+            if len(items) < limit:
+                items.append(item)
+            elif not count_all:
+                break
+    return items, count
 
 async def send_webhook_notification(job_id: str, webhook_url: str):
     """Send completion notification to webhook"""
-    import aiohttp
-    
     try:
-        job_data = scraper_jobs.get(job_id, {})
+        job_data = (await get_job(job_id)) or {}
         
         # Prepare webhook payload
         payload = {
             "job_id": job_id,
             "status": job_data.get("status", "unknown"),
             "scraper": "jumbo",
-            "completed_at": job_data.get("completed_at", datetime.now(timezone.utc)).isoformat() if job_data.get("completed_at") else None,
+            "completed_at": job_data.get("completed_at"),
             "duration_seconds": None,
             "products_scraped": None,
-            "webhook_sent_at": datetime.now(timezone.utc).isoformat()
+            "webhook_sent_at": utc_now_iso()
         }
         
         # Calculate duration if both timestamps exist
         if job_data.get("started_at") and job_data.get("completed_at"):
-            duration = (job_data["completed_at"] - job_data["started_at"]).total_seconds()
+            duration = (datetime.fromisoformat(job_data["completed_at"]) -
+                        datetime.fromisoformat(job_data["started_at"])).total_seconds()
             payload["duration_seconds"] = duration
         
-        # Try to get product count from results file
-        try:
-            results_file = job_data.get("output_file", f"/app/results/{job_id}_products.json")
-            if os.path.exists(results_file):
-                with open(results_file, 'r') as f:
-                    results = json.load(f)
-                    payload["products_scraped"] = len(results) if isinstance(results, list) else results.get("total_products", 0)
-        except Exception as e:
-            logger.warning(f"Could not determine product count for job {job_id}: {e}")
+        # Product count: recorded at compaction, else the job's latest progress checkpoint
+        payload["products_scraped"] = job_data.get("total_products")
+        if payload["products_scraped"] is None:
+            progress_data = await load_progress_file(f"/app/jobs/{job_id}_progress.json")
+            if progress_data is not None:
+                payload["products_scraped"] = progress_data.get("total_scraped")
+            else:
+                logger.warning(f"Could not determine product count for job {job_id}")
         
-        # Send webhook
-        timeout = aiohttp.ClientTimeout(total=30)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.post(webhook_url, json=payload) as response:
-                if response.status == 200:
-                    logger.info(f"Webhook notification sent successfully for job {job_id}")
-                else:
-                    logger.warning(f"Webhook returned status {response.status} for job {job_id}")
+        # Send the pre-encoded body over the shared session (connections are reused between jobs)
+        body = json_dumps_bytes(payload)
+        async with app.state.http.post(webhook_url, data=body, headers=WEBHOOK_HEADERS) as response:
+            if response.status == 200:
+                logger.info(f"Webhook notification sent successfully for job {job_id}")
+            else:
+                logger.warning(f"Webhook returned status {response.status} for job {job_id}")
                     
     except Exception as e:
         logger.error(f"Failed to send webhook notification for job {job_id}: {e}")
 
 def get_running_job_count() -> int:
     """Get count of currently running jobs"""
-    return sum(1 for job in scraper_jobs.values() if job.get("status") == "running")
+    return len(jobs_by_status["running"])
+
+def get_queued_job_count() -> int:
+    """Get count of jobs waiting for a free slot"""
+    return len(jobs_by_status["queued"])
 
 def can_accept_new_job() -> bool:
-    """Check if we can accept a new job based on concurrent limits"""
-    return get_running_job_count() < MAX_CONCURRENT_JOBS
+    """Check if the wait queue has room; running jobs are bounded by job_slots"""
+    return get_queued_job_count() < MAX_QUEUED_JOBS
 
 # API Routes
 
@@ -287,7 +587,7 @@ async def health_check():
         status="healthy",
         version="2.0.0", 
         active_jobs=get_running_job_count(),
-        total_jobs=len(scraper_jobs),
+        total_jobs=await asyncio.to_thread(job_store.count),
         uptime_seconds=uptime
     )
 
@@ -295,11 +595,11 @@ async def health_check():
 async def start_scraping_job(request: ScrapingRequest, background_tasks: BackgroundTasks):
     """Start a new Jumbo scraping job"""
     
-    # Check concurrent job limit
+    # Jobs queue for a slot; only reject once the wait queue itself is full
     if not can_accept_new_job():
         raise HTTPException(
             status_code=503,
-            detail=f"Maximum concurrent jobs ({MAX_CONCURRENT_JOBS}) exceeded. Currently running: {get_running_job_count()}"
+            detail=f"Job queue full ({MAX_QUEUED_JOBS} queued). Currently running: {get_running_job_count()}"
         )
     
     # Generate job ID
@@ -310,15 +610,17 @@ async def start_scraping_job(request: ScrapingRequest, background_tasks: Backgro
         "job_id": job_id,
         "status": "queued",
         "progress": {},
-        "created_at": datetime.now(timezone.utc),
+        "created_at": utc_now_iso(),
         "started_at": None,
         "completed_at": None,
         "error": None,
         "config": request.dict()
     }
+    jobs_by_status["queued"].add(job_id)
+    await save_job(scraper_jobs[job_id])
     
     # Start background task
-    background_tasks.add_task(run_scraper_subprocess, job_id, request)
+    background_tasks.add_task(run_scraper_job, job_id, request)
     
     logger.info(f"Queued new Jumbo scraping job: {job_id}")
     
@@ -331,43 +633,22 @@ async def start_scraping_job(request: ScrapingRequest, background_tasks: Backgro
 @app.get("/jobs", response_model=List[Dict[str, Any]])
 async def list_jobs(status: Optional[str] = Query(None, description="Filter jobs by status")):
     """List all scraping jobs"""
-    jobs = list(scraper_jobs.values())
-    
-    if status:
-        jobs = [job for job in jobs if job.get("status") == status]
-    
-    # Convert datetime objects to ISO strings for JSON serialization
-    for job in jobs:
-        for key in ["created_at", "started_at", "completed_at"]:
-            if job.get(key) and isinstance(job[key], datetime):
-                job[key] = job[key].isoformat()
-    
-    return jobs
+    if status in ACTIVE_STATUSES:
+        return FastJSONResponse([scraper_jobs[job_id] for job_id in jobs_by_status[status]])
+    return FastJSONResponse(await asyncio.to_thread(job_store.list, status))
 
 @app.get("/jobs/{job_id}", response_model=Dict[str, Any])
 async def get_job_status(job_id: str):
     """Get status of a specific job"""
-    if job_id not in scraper_jobs:
+    job = await get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
     
-    job = scraper_jobs[job_id].copy()
-    
-    # Add real-time progress if available
-    progress_file = f"/app/jobs/{job_id}_progress.json"
-    if os.path.exists(progress_file):
-        try:
-            with open(progress_file, 'r') as f:
-                progress_data = json.load(f)
-                job["progress"] = progress_data
-        except (json.JSONDecodeError, FileNotFoundError):
-            pass
-    
-    # Convert datetime objects to ISO strings
-    for key in ["created_at", "started_at", "completed_at"]:
-        if job.get(key) and isinstance(job[key], datetime):
-            job[key] = job[key].isoformat()
-    
-    return job
+    # Add real-time progress if available; the stored record itself is never copied or mutated
+    progress_data = await load_progress_file(f"/app/jobs/{job_id}_progress.json")
+    if progress_data is None:
+        return FastJSONResponse(job)
+    return FastJSONResponse({**job, "progress": progress_data})
 
 @app.get("/jobs/{job_id}/results")
 async def get_job_results(
@@ -376,20 +657,52 @@ async def get_job_results(
     limit: Optional[int] = Query(None, description="Limit number of products returned")
 ):
     """Get results from a completed job"""
-    if job_id not in scraper_jobs:
+    job = await get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
     
-    job = scraper_jobs[job_id]
     if job.get("status") != "completed":
         raise HTTPException(status_code=400, detail=f"Job {job_id} is not completed (status: {job.get('status')})")
     
     results_file = f"/app/results/{job_id}_products.json"
-    if not os.path.exists(results_file):
+    if not await asyncio.to_thread(os.path.exists, results_file):
         raise HTTPException(status_code=404, detail=f"Results file not found for job {job_id}")
     
     try:
-        with open(results_file, 'r') as f:
-            results = json.load(f)
+        known_total = job.get("total_products")
+        
+        # Full download: stream the file as-is instead of loading it into memory
+        if format != "summary" and not limit and known_total is not None and aiofiles is not None:
+            return StreamingResponse(
+                stream_results_envelope(job_id, results_file, known_total),
+                media_type="application/json"
+            )
+        
+        # Bounded reads: parse only the products the response needs
+        if format == "summary" or limit:
+            wanted = min(limit or 5, 5) if format == "summary" else limit
+            streamed = await read_result_items(
+                results_file, wanted, count_all=(format == "summary" and known_total is None)
+            )
+            if streamed is not None:
+                items, counted = streamed
+                if format == "summary":
+                    total_products = known_total if known_total is not None else counted
+                    return FastJSONResponse({
+                        "job_id": job_id,
+                        "total_products": total_products,
+                        "returned_products": min(limit, total_products) if limit else total_products,
+                        "sample_products": items,
+                        "format": "summary"
+                    })
+                return FastJSONResponse({
+                    "job_id": job_id,
+                    "results": items,
+                    "total_products": len(items),
+                    "format": "full"
+                })
+        
+        results = await read_json_file(results_file)
         
         if format == "summary":
             # Return summary statistics
@@ -398,32 +711,32 @@ async def get_job_results(
                 if limit:
                     results = results[:limit]
                 
-                return {
+                return FastJSONResponse({
                     "job_id": job_id,
                     "total_products": total_products,
                     "returned_products": len(results),
                     "sample_products": results[:5] if results else [],
                     "format": "summary"
-                }
+                })
             else:
-                return {
+                return FastJSONResponse({
                     "job_id": job_id,
                     "results": results,
                     "format": "summary"
-                }
+                })
         
         # Full format
         if isinstance(results, list) and limit:
             results = results[:limit]
         
-        return {
+        return FastJSONResponse({
             "job_id": job_id,
             "results": results,
             "total_products": len(results) if isinstance(results, list) else None,
             "format": "full"
-        }
+        })
         
-    except json.JSONDecodeError:
+    except ValueError:
         raise HTTPException(status_code=500, detail="Invalid results file format")
 
 @app.get("/jobs/{job_id}/logs")
@@ -432,26 +745,29 @@ async def get_job_logs(
     tail: Optional[int] = Query(None, description="Return last N lines")
 ):
     """Get logs from a job"""
-    if job_id not in scraper_jobs:
+    if await get_job(job_id) is None:
         raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
     
     log_file = f"/app/logs/{job_id}.log"
-    if not os.path.exists(log_file):
+    if not await asyncio.to_thread(os.path.exists, log_file):
         return {"job_id": job_id, "logs": "No logs available", "lines": 0}
     
     try:
-        with open(log_file, 'r') as f:
-            lines = f.readlines()
-        
-        if tail and len(lines) > tail:
-            lines = lines[-tail:]
+        if tail:
+            # Only the end of the file is read, however large the log has grown
+            lines = await asyncio.to_thread(read_log_tail, log_file, tail)
+        elif aiofiles is not None:
+            async with aiofiles.open(log_file, 'r') as f:
+                lines = await f.readlines()
+        else:
+            lines = (await read_file_async(log_file)).decode('utf-8', errors='replace').splitlines(keepends=True)
         
-        return {
+        return FastJSONResponse({
             "job_id": job_id,
             "logs": "".join(lines),
             "lines": len(lines),
             "total_lines": len(lines) if not tail else None
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading log file: {str(e)}")
@@ -459,90 +775,78 @@ async def get_job_logs(
 @app.delete("/jobs/{job_id}")
 async def cancel_job(job_id: str):
     """Cancel a running job"""
-    if job_id not in scraper_jobs:
+    job = await get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
     
-    job = scraper_jobs[job_id]
-    
     if job.get("status") not in ["queued", "running"]:
         raise HTTPException(status_code=400, detail=f"Job {job_id} cannot be cancelled (status: {job.get('status')})")
     
-    # Terminate the process if it's running
-    if job_id in active_processes:
-        try:
-            process = active_processes[job_id]
-            process.terminate()
-            
-            # Wait up to 10 seconds for graceful termination
-            try:
-                process.wait(timeout=10)
-            except subprocess.TimeoutExpired:
-                process.kill()
-                process.wait()
-            
-            logger.info(f"Terminated job {job_id}")
-            
-        except Exception as e:
-            logger.error(f"Error terminating job {job_id}: {e}")
+    # Recorded first, so a job still starting up stops before it creates its scraper task
+    if job_id in scraper_jobs:
+        cancel_requested.add(job_id)
+    
+    # Cancel the scraper task if it's running; it saves progress on the way out
+    task = active_tasks.get(job_id)
+    if task is not None:
+        task.cancel()
+        
+        # Wait up to 10 seconds for the task to finish its cleanup
+        done, _ = await asyncio.wait([task], timeout=10)
+        if done:
+            logger.info(f"Cancelled job {job_id}")
+        else:
+            logger.warning(f"Job {job_id} still cleaning up after cancellation")
     
     # Update job status
-    scraper_jobs[job_id].update({
-        "status": "cancelled",
-        "completed_at": datetime.now(timezone.utc),
-        "error": "Job cancelled by user"
-    })
+    await set_status(
+        job_id, "cancelled",
+        completed_at=utc_now_iso(),
+        error="Job cancelled by user"
+    )
     
     return {"job_id": job_id, "status": "cancelled", "message": f"Job {job_id} has been cancelled"}
 
 @app.get("/progress")
-async def get_progress_summary():
+async def get_progress_summary(request: Request):
     """Get clean progress summary for N8N monitoring (without product lists)"""
     # Check if there's a live progress file (updated by active scraper)
     live_progress_file = "/app/shared-data/jumbo_live_progress.json"
-    if os.path.exists(live_progress_file):
-        try:
-            with open(live_progress_file, 'r') as f:
-                live_progress = json.load(f)
-            return live_progress
-        except (json.JSONDecodeError, FileNotFoundError):
-            pass
+    live_progress = await load_progress_file(live_progress_file)
+    if live_progress is not None:
+        return progress_response(request, progress_etag(live_progress_file), live_progress)
     
     # Fallback: find the most recent running job and get clean progress
-    running_jobs = [job for job in scraper_jobs.values() if job.get("status") == "running"]
+    running_jobs = [scraper_jobs[job_id] for job_id in jobs_by_status["running"]]
     if running_jobs:
-        # Get the most recent running job
-        latest_job = max(running_jobs, key=lambda x: x.get("created_at", datetime.min))
+        # Get the most recent running job (ISO timestamps sort chronologically)
+        latest_job = max(running_jobs, key=lambda x: x.get("created_at") or "")
         job_id = latest_job.get("job_id")
         
         # Load progress data but return clean summary
         progress_file = f"/app/jobs/{job_id}_progress.json"
-        if os.path.exists(progress_file):
-            try:
-                with open(progress_file, 'r') as f:
-                    progress_data = json.load(f)
-                
-                return {
-                    "scraper_name": "jumbo",
-                    "job_id": job_id,
-                    "status": "running",
-                    "progress_percent": progress_data.get("estimated_progress_percent", 0),
-                    "products_scraped": progress_data.get("total_scraped", 0),
-                    "current_task": f"Processing at offset {progress_data.get('current_offset', 0)}",
-                    "products_per_second": progress_data.get("products_per_second", 0),
-                    "timestamp": progress_data.get("timestamp_amsterdam", ""),
-                    "batch_size": progress_data.get("current_batch_size", 100),
-                    "successful_requests": progress_data.get("successful_requests", 0),
-                    "failed_requests": progress_data.get("failed_requests", 0)
-                }
-            except (json.JSONDecodeError, FileNotFoundError):
-                pass
+        progress_data = await load_progress_file(progress_file)
+        if progress_data is not None:
+            return progress_response(request, progress_etag(progress_file, prefix=f"{job_id}-"), {
+                "scraper_name": "jumbo",
+                "job_id": job_id,
+                "status": "running",
+                "progress_percent": progress_data.get("estimated_progress_percent", 0),
+                "products_scraped": progress_data.get("total_scraped", 0),
+                "current_task": f"Processing at offset {progress_data.get('current_offset', 0)}",
+                "products_per_second": progress_data.get("products_per_second", 0),
+                "timestamp": progress_data.get("timestamp_amsterdam", ""),
+                "batch_size": progress_data.get("current_batch_size", 100),
+                "successful_requests": progress_data.get("successful_requests", 0),
+                "failed_requests": progress_data.get("failed_requests", 0)
+            })
     
     # No running jobs
     return {
         "scraper_name": "jumbo",
         "status": "idle",
         "active_jobs": get_running_job_count(),
-        "total_jobs": len(scraper_jobs),
+        "total_jobs": await asyncio.to_thread(job_store.count),
         "message": "No scraping jobs currently running"
     }
 
@@ -550,20 +854,15 @@ async def get_progress_summary():
 async def get_service_stats():
     """Get service statistics"""
     stats = {
-        "total_jobs": len(scraper_jobs),
+        "total_jobs": await asyncio.to_thread(job_store.count),
         "active_jobs": get_running_job_count(),
         "max_concurrent_jobs": MAX_CONCURRENT_JOBS,
+        "queued_jobs": get_queued_job_count(),
         "uptime_seconds": time.time() - getattr(app.state, 'startup_time', time.time()),
-        "jobs_by_status": {}
+        "jobs_by_status": await asyncio.to_thread(job_store.count_by_status)
     }
     
-    # Count jobs by status
-    for job in scraper_jobs.values():
-        status = job.get("status", "unknown")
-        stats["jobs_by_status"][status] = stats["jobs_by_status"].get(status, 0) + 1
-    
     return stats
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop")
\ No newline at end of file
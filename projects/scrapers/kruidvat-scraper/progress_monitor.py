@@ -4,12 +4,59 @@ Progress Monitor - Simplified for Container Deployment
 Provides basic progress tracking functionality for the AH scraper
 """
 
+import asyncio
 import json
 import os
 import time
 from datetime import datetime, timezone
 from enum import Enum
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Durable directory for status/progress files; only written once a scraper reaches a terminal status
+JOBS_DIR = "/app/jobs"
+
+# tmpfs directory for the per-tick status/progress writes (falls back to JOBS_DIR without /dev/shm)
+STATUS_DIR = os.environ.get("SCRAPER_STATUS_DIR", "/dev/shm/jobs" if os.path.isdir("/dev/shm") else JOBS_DIR)
+
+# Directories are created once here instead of on every update
+for _directory in {JOBS_DIR, STATUS_DIR}:
+    try:
+        os.makedirs(_directory, exist_ok=True)
+    except OSError as e:
+        print(f"Could not create {_directory}: {e}")
+
+# Minimum seconds between live-progress file writes while the async flusher is running
+PROGRESS_FLUSH_INTERVAL = 0.25
+
+# Latest unflushed progress per scraper; only used while the flusher task is active
+_latest_progress = {}
+# Scrapers whose last status was terminal; their files are mirrored to JOBS_DIR
+_terminal_scrapers = set()
+_progress_dirty = None
+_flusher_task = None
+
+
+def _dumps_pretty(data) -> bytes:
+    """Serialize monitoring data as indented JSON bytes (orjson when available)"""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, default=str).encode('utf-8')
+
+
+def _write_atomic(path: str, payload: bytes):
+    """Write payload with a single write() to a temp file and swap it in, so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, payload)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
 class ScraperStatus(Enum):
     """Enumeration of possible scraper statuses"""
     STARTING = "starting"
@@ -19,28 +66,37 @@ class ScraperStatus(Enum):
     INTERRUPTED = "interrupted"
     CANCELLED = "cancelled"
 
-def get_amsterdam_time():
-    """Get current time in Amsterdam timezone"""
+TERMINAL_STATUSES = {ScraperStatus.COMPLETED, ScraperStatus.FAILED,
+                     ScraperStatus.INTERRUPTED, ScraperStatus.CANCELLED}
+
+def get_amsterdam_time(now: datetime = None):
+    """Get current time in Amsterdam timezone, reusing `now` when the caller already has it"""
     # Simplified - just return UTC time with CET label for container deployment
-    return datetime.now(timezone.utc)
+    return now if now is not None else datetime.now(timezone.utc)
 
 def update_status(scraper_name: str, status: ScraperStatus, message: str = ""):
     """Update the status of a scraper"""
     try:
+        now = datetime.now(timezone.utc)
         status_data = {
             "scraper_name": scraper_name,
             "status": status.value if isinstance(status, ScraperStatus) else str(status),
             "message": message,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "timestamp_amsterdam": get_amsterdam_time().strftime('%Y-%m-%d %H:%M:%S CET')
+            "timestamp": now.isoformat(),
+            "timestamp_amsterdam": get_amsterdam_time(now).strftime('%Y-%m-%d %H:%M:%S CET')
         }
         
         # Write to status file for monitoring
-        status_file = f"/app/jobs/{scraper_name}_status.json"
-        os.makedirs(os.path.dirname(status_file), exist_ok=True)
-        
-        with open(status_file, "w") as f:
-            json.dump(status_data, f, indent=2)
+        payload = _dumps_pretty(status_data)
+        _write_atomic(f"{STATUS_DIR}/{scraper_name}_status.json", payload)
+
+        # Persist terminal statuses outside tmpfs
+        if status in TERMINAL_STATUSES:
+            _terminal_scrapers.add(scraper_name)
+            if STATUS_DIR != JOBS_DIR:
+                _write_atomic(f"{JOBS_DIR}/{scraper_name}_status.json", payload)
+        else:
+            _terminal_scrapers.discard(scraper_name)
         
         # Also log to console
         print(f"[STATUS] {scraper_name}: {status_data['status']} - {message}")
@@ -51,38 +107,97 @@ def update_status(scraper_name: str, status: ScraperStatus, message: str = ""):
 def update_progress(scraper_name: str, **kwargs):
     """Update the progress of a scraper with arbitrary progress data"""
     try:
+        now = datetime.now(timezone.utc)
         progress_data = {
             "scraper_name": scraper_name,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "timestamp_amsterdam": get_amsterdam_time().strftime('%Y-%m-%d %H:%M:%S CET'),
+            "timestamp": now.isoformat(),
+            "timestamp_amsterdam": get_amsterdam_time(now).strftime('%Y-%m-%d %H:%M:%S CET'),
             **kwargs  # Include all provided progress data
         }
         
         # Write to progress file for monitoring
-        progress_file = f"/app/jobs/{scraper_name}_live_progress.json"
-        os.makedirs(os.path.dirname(progress_file), exist_ok=True)
-        
-        with open(progress_file, "w") as f:
-            json.dump(progress_data, f, indent=2)
-        
-        # Log key progress metrics
-        if 'progress_percent' in kwargs:
-            print(f"[PROGRESS] {scraper_name}: {kwargs['progress_percent']:.1f}% complete")
-        
-        if 'products_scraped' in kwargs:
-            print(f"[PROGRESS] {scraper_name}: {kwargs['products_scraped']} products scraped")
+        # Merge into the pending snapshot when the async flusher is running, so fields
+        # from every call in the window (e.g. categories_total) land in one write
+        if _progress_dirty is not None:
+            pending = _latest_progress.get(scraper_name)
+            if pending is None:
+                _latest_progress[scraper_name] = progress_data
+            else:
+                pending.update(progress_data)
+            _progress_dirty.set()
+            return
+
+        _write_progress(scraper_name, progress_data)
         
     except Exception as e:
         print(f"Error updating progress for {scraper_name}: {e}")
 
+def _write_progress(scraper_name: str, progress_data: dict):
+    """Write a progress snapshot to disk and log its key metrics"""
+    payload = _dumps_pretty(progress_data)
+    _write_atomic(f"{STATUS_DIR}/{scraper_name}_live_progress.json", payload)
+    if scraper_name in _terminal_scrapers and STATUS_DIR != JOBS_DIR:
+        _write_atomic(f"{JOBS_DIR}/{scraper_name}_live_progress.json", payload)
+    
+    # Log key progress metrics
+    if 'progress_percent' in progress_data:
+        print(f"[PROGRESS] {scraper_name}: {progress_data['progress_percent']:.1f}% complete")
+    
+    if 'products_scraped' in progress_data:
+        print(f"[PROGRESS] {scraper_name}: {progress_data['products_scraped']} products scraped")
+
+def flush_progress():
+    """Write any coalesced progress snapshots immediately"""
+    while _latest_progress:
+        scraper_name, progress_data = _latest_progress.popitem()
+        try:
+            _write_progress(scraper_name, progress_data)
+        except Exception as e:
+            print(f"Error updating progress for {scraper_name}: {e}")
+
+async def _progress_flusher():
+    """Write the latest progress at most once per PROGRESS_FLUSH_INTERVAL"""
+    while True:
+        await _progress_dirty.wait()
+        _progress_dirty.clear()
+        flush_progress()
+        await asyncio.sleep(PROGRESS_FLUSH_INTERVAL)
+
+def start_progress_flusher():
+    """Start coalescing update_progress calls; must be called from a running event loop"""
+    global _progress_dirty, _flusher_task
+    if _flusher_task is not None:
+        return
+    _progress_dirty = asyncio.Event()
+    _flusher_task = asyncio.create_task(_progress_flusher())
+
+async def stop_progress_flusher():
+    """Stop the flusher and write whatever progress is still pending"""
+    global _progress_dirty, _flusher_task
+    if _flusher_task is None:
+        return
+    _flusher_task.cancel()
+    try:
+        await _flusher_task
+    except asyncio.CancelledError:
+        pass
+    _flusher_task = None
+    _progress_dirty = None
+    flush_progress()
+
+def _read_monitor_file(filename: str):
+    """Read a status/progress file, preferring the live tmpfs copy over the persisted one"""
+    for directory in (STATUS_DIR, JOBS_DIR):
+        file_path = f"{directory}/{filename}"
+        if os.path.exists(file_path):
+            with open(file_path, "r") as f:
+                return json.load(f)
+    return None
+
 def get_scraper_status(scraper_name: str):
     """Get the current status of a scraper"""
     try:
-        status_file = f"/app/jobs/{scraper_name}_status.json"
-        if os.path.exists(status_file):
-            with open(status_file, "r") as f:
-                return json.load(f)
-        return None
+        return _read_monitor_file(f"{scraper_name}_status.json")
     except Exception as e:
         print(f"Error getting status for {scraper_name}: {e}")
         return None
@@ -90,11 +205,7 @@ def get_scraper_status(scraper_name: str):
 def get_scraper_progress(scraper_name: str):
     """Get the current progress of a scraper"""
     try:
-        progress_file = f"/app/jobs/{scraper_name}_live_progress.json"
-        if os.path.exists(progress_file):
-            with open(progress_file, "r") as f:
-                return json.load(f)
-        return None
+        return _read_monitor_file(f"{scraper_name}_live_progress.json")
     except Exception as e:
         print(f"Error getting progress for {scraper_name}: {e}")
         return None
@@ -102,10 +213,12 @@ def get_scraper_progress(scraper_name: str):
 def cleanup_scraper_files(scraper_name: str):
     """Clean up status and progress files for a scraper"""
     try:
-        status_file = f"/app/jobs/{scraper_name}_status.json"
-        progress_file = f"/app/jobs/{scraper_name}_live_progress.json"
+        file_paths = [f"{directory}/{scraper_name}_{suffix}.json"
+                      for directory in {STATUS_DIR, JOBS_DIR}
+                      for suffix in ("status", "live_progress")]
+        _terminal_scrapers.discard(scraper_name)
         
-        for file_path in [status_file, progress_file]:
+        for file_path in file_paths:
             if os.path.exists(file_path):
                 os.remove(file_path)
                 print(f"Cleaned up {file_path}")
@@ -5,7 +5,7 @@ Plus Ultra-Optimized Scraper - FIXED VERSION
 Fixed all major issues from previous ultra-optimization attempt:
 
 PROBLEMS IDENTIFIED & FIXED:
-1. ❌ CSRF token expiry -> ✅ Fresh token every 500 requests  
+1. ❌ CSRF token expiry -> ✅ Token refreshed on demand when the API rejects it
 2. ❌ Rate limit auto-increase (0.05s -> 1.23s) -> ✅ Fixed at 0.05s
 3. ❌ Lost concurrency (sequential processing) -> ✅ Maintained 8 concurrent categories
 4. ❌ Low semaphore limit (5) -> ✅ Increased to 15 for true concurrency
@@ -21,15 +21,49 @@ ULTRA-OPTIMIZATION STRATEGY:
 
 import aiohttp
 import asyncio
+import itertools
 import json
 import os
 import logging
+import re
 import time
 import signal
+import threading
+import urllib.parse
+from dataclasses import dataclass, field
 from datetime import datetime
 from random import uniform
 from typing import Dict, List, Optional, Tuple
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import aiodns  # enables aiohttp's non-blocking AsyncResolver
+except ImportError:
+    aiodns = None
+
+# aiohttp decodes brotli responses only when one of these packages is installed
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
 # Import progress monitoring
 # Import utility modules (create simplified versions if needed)
 try:
@@ -69,6 +103,40 @@ logging.basicConfig(
 
 logging.getLogger('aiohttp').setLevel(logging.WARNING)
 
+# Per-page/per-request logging uses this logger with %-style args so messages are only built when emitted
+logger = logging.getLogger(__name__)
+
+# Fast JSON helpers (orjson when available, stdlib json otherwise).
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so existing except clauses still apply.
+def json_loads(raw):
+    """Parse JSON from bytes or str."""
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+def json_dumps(obj) -> bytes:
+    """Serialize obj to compact JSON bytes."""
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def json_dumps_pretty(obj) -> bytes:
+    """Serialize obj to indented JSON bytes for files people read."""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+def write_json_atomic(path, obj):
+    """Write obj as JSON with one write() to a temp file, then swap it into place."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(json_dumps(obj))
+    os.replace(tmp_path, path)
+
+def json_dumps_line(obj) -> bytes:
+    """Serialize obj as one NDJSON line."""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return json_dumps(obj) + b"\n"
+
 # Plus API configuration
 BASE_URL = "https://www.plus.nl"
 API_BASE_URL = f"{BASE_URL}/screenservices"
@@ -88,9 +156,13 @@ WORKING_VERSIONS = {
 # ULTRA-FIXED PARAMETERS
 OPTIMAL_PAGE_SIZE = 100           # 36.0 products/sec per request (proven)
 FIXED_REQUEST_INTERVAL = 0.05     # FIXED - no auto-adjustment 
-MAX_CONCURRENT_CATEGORIES = 8     # High concurrency
-HIGH_SEMAPHORE_LIMIT = 15         # INCREASED from 5 to prevent bottleneck
-AUTH_REFRESH_INTERVAL = 500       # Refresh token every 500 requests
+MAX_CONCURRENT_CATEGORIES = 8     # Reported only; categories share the page workers
+HIGH_SEMAPHORE_LIMIT = 15         # Page workers = connections per host (INCREASED from 5)
+AUTH_FAILURE_STATUSES = {401, 403} # Responses that trigger an on-demand CSRF refresh
+MAX_EMPTY_PAGES_PER_CATEGORY = 3  # Consecutive empty/failed pages before a category is given up
+CHECKPOINT_INTERVAL_SECONDS = 5.0 # Minimum seconds between progress-file writes (final saves are forced)
+PROGRESS_UPDATE_INTERVAL_SECONDS = 0.5  # Minimum seconds between live progress updates
+PRODUCT_WRITE_QUEUE_SIZE = 1024   # Pages buffered for the NDJSON writer before save_products waits
 
 # Test mode parameters
 TEST_MODE = False                 # FULL MODE - complete catalog scraping
@@ -102,7 +174,7 @@ ULTRA_HEADERS = {
     "User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 18_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
     "Accept": "application/json, text/plain, */*",
     "Accept-Language": "nl-NL,nl;q=0.9",
-    "Accept-Encoding": "gzip, deflate, br",
+    "Accept-Encoding": "gzip, deflate, br" if brotli else "gzip, deflate",
     "Content-Type": "application/json; charset=UTF-8",
     "Origin": "https://www.plus.nl",
     "Referer": "https://www.plus.nl/producten",
@@ -116,6 +188,78 @@ ULTRA_HEADERS = {
     "Pragma": "no-cache"
 }
 
+# Static part of the product list request, built once; per-page fields are merged in by get_products_ultra_fixed
+PRODUCT_LIST_VERSION_INFO = {
+    "moduleVersion": WORKING_VERSIONS['moduleVersion'],
+    "apiVersion": WORKING_VERSIONS['products_apiVersion']
+}
+PRODUCT_LIST_VARIABLES = {
+    "CategorySlug": "",
+    "PageNumber": 1,
+    "PageSize": OPTIMAL_PAGE_SIZE,  # FIXED at 100
+    "AppliedFiltersList": {"List": []},
+    "LocalCategoryID": 0,
+    "LocalCategoryName": "",
+    "LocalCategoryParentId": 0,
+    "LocalCategoryTitle": "",
+    "IsLoadingMore": False,
+    "IsFirstDataFetched": False,
+    "ShowFilters": False,
+    "IsShowData": False,
+    "StoreNumber": 0,
+    "StoreChannel": "",
+    "CheckoutId": "",
+    "IsOrderEditMode": False,
+    "ProductList_All": {"List": []},
+    "SelectedSort": "",
+    "OrderEditId": "",
+    "IsListRendered": False,
+    "IsAlreadyFetch": False,
+    "IsPromotionBannersFetched": False,
+    "Period": {
+        "FromDate": "2025-08-18",
+        "ToDate": "2025-08-24"
+    },
+    "UserStoreId": "0",
+    "FilterExpandedList": {"List": []},
+    "ItemsInCart": {"List": []},
+    "HideDummy": False,
+    "OneWelcomeUserId": "",
+    "SearchKeyword": "",
+    "IsDesktop": False,
+    "IsSearch": False,
+    "URLPageNumber": 0,
+    "FilterQueryURL": "",
+    "IsMobile": True,
+    "IsTablet": False,
+    "Monitoring_FlowTypeId": 3,
+    "IsCustomerUnderAge": False
+}
+
+# CSRF token patterns, compiled once: (pattern, extractor) pairs for cookie values, plain patterns for the page
+COOKIE_CSRF_PATTERNS = (
+    (re.compile(r'crf%3d([^%\\s]+(?:%[0-9A-Fa-f]{2})*)', re.IGNORECASE), lambda m: urllib.parse.unquote(m.group(1))),
+    (re.compile(r'crf=([^;\\s&]+)', re.IGNORECASE), lambda m: m.group(1)),
+)
+PAGE_CSRF_PATTERNS = (
+    re.compile(r'name=["\']csrf[_-]?token["\'][^>]*value=["\']([^"\']+)["\']', re.IGNORECASE),
+    re.compile(r'csrf[_-]?token["\']?\\s*[:=]\\s*["\']([^"\']+)["\']', re.IGNORECASE),
+    re.compile(r'"csrfToken"\\s*:\\s*"([^"]+)"', re.IGNORECASE),
+)
+
+@dataclass
+class CategoryCrawl:
+    """Page bookkeeping for one category while its pages move through the work queue."""
+    category: dict
+    first_page: int
+    next_page: int
+    last_page: int
+    total_known: bool = False
+    pending: int = 0                  # pages queued or being fetched
+    consecutive_empty: int = 0
+    total_products: int = 0
+    done_pages: set = field(default_factory=set)
+
 class PlusUltraFixedScraper:
     def __init__(self, config_file=None):
         self.base_url = BASE_URL
@@ -128,6 +272,9 @@ class PlusUltraFixedScraper:
         # Default paths
         self.session_file = "/app/jobs/plus_session.json"
         
+        # Scraping limits (overridden by the job config)
+        self.max_products_limit: Optional[int] = None
+        
         # NEW: Load configuration from file if provided
         if config_file and os.path.exists(config_file):
             self.load_config(config_file)
@@ -149,7 +296,7 @@ class PlusUltraFixedScraper:
             self.completed_flag = config.get('complete_flag', self.completed_flag)
             
             # Apply scraping limits
-            self.max_products_limit = config.get('max_products', None)
+            self.max_products_limit = config.get('max_products') or None  # 0 means no limit
             self.categories_limit = config.get('categories_limit', None)
             
             # Webhook configuration
@@ -166,6 +313,12 @@ class PlusUltraFixedScraper:
         os.makedirs("/app/data", exist_ok=True)
         os.makedirs("/app/progress", exist_ok=True)
 
+        # Products are appended to an NDJSON sidecar and aggregated into products_file at the end
+        self.products_ndjson = os.path.splitext(self.products_file)[0] + '.ndjson'
+        self._products_fd = None  # append-only fd for products_ndjson, opened on first save
+        self._write_queue = None  # page buffers for the background NDJSON writer, created in run()
+        self._writer_task = None
+
         # Performance tracking
         self.scraped_products = set()
         self.scraped_categories = set()
@@ -187,9 +340,17 @@ class PlusUltraFixedScraper:
         self.csrf_token = None
         self.version_info = None
         self.last_auth_refresh = 0
+        self.auth_lock = None  # created in run(); one CSRF refresh at a time
         
         # Performance metrics
-        self.start_time = time.time()
+        self.start_time = time.monotonic()  # elapsed/rate math only; wall-clock stamps use time.time()
+        self._last_checkpoint_at = 0
+        self._last_progress_push = 0.0  # time.monotonic() of the last update_progress call
+        self._last_page = ('', 0)  # (category, page) most recently processed, for the final push
+        self._checkout_id_prefix = f"ultra-fixed-{int(time.time())}-"  # CheckoutId only disambiguates requests
+        self._checkout_counter = itertools.count(1)
+        self._checkpoint_task = None  # background progress write started by _maybe_checkpoint
+        self._progress_write_lock = threading.Lock()  # one writer for progress_file at a time
         self.products_per_second = 0
         self.requests_per_minute = 0
         
@@ -211,40 +372,47 @@ class PlusUltraFixedScraper:
             self.load_existing_data()
         else:
             self.load_progress()
+            self.import_legacy_products_file()
+            self.load_saved_skus()
             self.load_session()
 
         mode_str = "TEST MODE (3 categories, 5 pages each)" if TEST_MODE else "FULL CATALOG"
         logging.info(f"🚀 PLUS ULTRA-FIXED SCRAPER INITIALIZED - {mode_str}")
         logging.info(f"   FIXED PageSize: {OPTIMAL_PAGE_SIZE} (36.0 products/sec per request)")
         logging.info(f"   FIXED Request interval: {self.base_delay}s (NO auto-adjustment)")
-        logging.info(f"   FIXED Concurrency: {MAX_CONCURRENT_CATEGORIES} categories")
-        logging.info(f"   FIXED Semaphore: {HIGH_SEMAPHORE_LIMIT} (increased from 5)")
-        logging.info(f"   Auth refresh: Every {AUTH_REFRESH_INTERVAL} requests")
+        logging.info(f"   FIXED Page workers: {HIGH_SEMAPHORE_LIMIT} (increased from 5)")
+        logging.info(f"   Auth refresh: On demand (HTTP {sorted(AUTH_FAILURE_STATUSES)})")
         logging.info(f"   Expected performance: 200+ products/sec")
 
     def signal_handler(self, signum, frame):
         """Handle shutdown signals gracefully."""
         logging.info(f"🛑 Received signal {signum}, shutting down gracefully...")
         self.shutdown_requested = True
+        self.save_progress()  # don't lose the debounced checkpoint window
         update_status('plus', ScraperStatus.INTERRUPTED, "Shutdown requested")
 
     def load_existing_data(self):
         """Load existing product data for reporting."""
         if os.path.exists(self.products_file):
             try:
-                with open(self.products_file, 'r') as f:
-                    existing_products = json.load(f)
-                    self.total_scraped = len(existing_products)
-                    logging.info(f"📊 Found {self.total_scraped} products from completed run")
-            except (json.JSONDecodeError, FileNotFoundError):
+                self.total_scraped = self.count_saved_products()
+                logging.info(f"📊 Found {self.total_scraped} products from completed run")
+            except Exception:  # ijson's IncompleteJSONError is not a JSONDecodeError
                 self.total_scraped = 0
 
+    def count_saved_products(self):
+        """Count the products in products_file without loading the whole array."""
+        with open(self.products_file, 'rb') as f:
+            if ijson is None:
+                return len(json_loads(f.read()))
+            return sum(1 for _ in ijson.items(f, 'item'))
+
     def load_progress(self):
         """Load previous scraping progress."""
         if os.path.exists(self.progress_file):
             try:
-                with open(self.progress_file, 'r') as f:
-                    progress = json.load(f)
+                with open(self.progress_file, 'rb') as f:
+                    progress = json_loads(f.read())
                     self.scraped_products = set(progress.get('scraped_products', []))
                     self.scraped_categories = set(progress.get('scraped_categories', []))
                     self.total_scraped = progress.get('total_scraped', 0)
@@ -258,12 +426,52 @@ class PlusUltraFixedScraper:
             except json.JSONDecodeError:
                 logging.warning("⚠️ Progress file corrupted, starting fresh")
 
+    def import_legacy_products_file(self):
+        """Seed the NDJSON sidecar from a products JSON array written before the sidecar existed.
+
+        A legacy progress file already lists those SKUs as scraped, so a resumed run would never
+        re-fetch them and finalize_products_file() would otherwise drop them.
+        """
+        if os.path.exists(self.products_ndjson) or not os.path.exists(self.products_file):
+            return
+        tmp_file = f"{self.products_ndjson}.tmp"
+        count = 0
+        try:
+            with open(self.products_file, 'rb') as src, open(tmp_file, 'wb') as dst:
+                items = ijson.items(src, 'item', use_float=True) if ijson is not None else json_loads(src.read())
+                for item in items:
+                    dst.write(json_dumps_line(item))
+                    count += 1
+        except Exception as e:  # ijson's IncompleteJSONError is not a JSONDecodeError
+            logging.warning(f"⚠️ Could not import legacy products from {self.products_file}: {e}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            return
+        os.replace(tmp_file, self.products_ndjson)
+        logging.info(f"📥 Imported {count} products from legacy {self.products_file}")
+
+    def load_saved_skus(self):
+        """Rebuild the SKU dedup set from the NDJSON sidecar so appends stay duplicate-free across restarts."""
+        if not os.path.exists(self.products_ndjson):
+            return
+        indexed = 0
+        with open(self.products_ndjson, 'rb') as f:
+            for line in f:
+                try:
+                    sku = json_loads(line)['product']['PLP_Str']['SKU']
+                except (ValueError, KeyError, TypeError):
+                    continue  # truncated last line from an interrupted write, or no SKU
+                if sku:
+                    self.scraped_products.add(sku)
+                    indexed += 1
+        logging.info(f"📂 Indexed {indexed} saved products")
+
     def load_session(self):
         """Load session cookies if they exist."""
         if os.path.exists(self.session_file):
             try:
-                with open(self.session_file, 'r') as f:
-                    session_data = json.load(f)
+                with open(self.session_file, 'rb') as f:
+                    session_data = json_loads(f.read())
                     self.session_cookies = session_data.get('cookies', {})
                     session_time = session_data.get('timestamp', 0)
                     if time.time() - session_time < 1800:  # 30 minutes
@@ -277,16 +485,20 @@ class PlusUltraFixedScraper:
 
     def save_progress(self):
         """Save current scraping progress with ultra-fixed metrics."""
-        elapsed_time = time.time() - self.start_time
+        self.write_progress(self.progress_snapshot())
+
+    def progress_snapshot(self):
+        """Build the progress-file payload; containers are copied so a worker thread can serialize it."""
+        elapsed_time = time.monotonic() - self.start_time
         if elapsed_time > 0:
             self.products_per_second = self.total_scraped / elapsed_time
             self.requests_per_minute = (self.requests_made / elapsed_time) * 60 if elapsed_time > 0 else 0
         
+        # Scraped SKUs are not listed here; load_saved_skus() recovers them from products_ndjson
         progress_data = {
-            'scraped_products': list(self.scraped_products),
             'scraped_categories': list(self.scraped_categories),
             'total_scraped': self.total_scraped,
-            'category_progress': self.category_progress,
+            'category_progress': dict(self.category_progress),
             'completed_categories': list(self.completed_categories),
             
             # ULTRA-FIXED: Enhanced tracking
@@ -311,8 +523,27 @@ class PlusUltraFixedScraper:
             'timestamp_amsterdam': get_amsterdam_time().strftime('%Y-%m-%d %H:%M:%S CET')
         }
         
-        with open(self.progress_file, 'w') as f:
-            json.dump(progress_data, f, indent=4)
+        return progress_data
+
+    def write_progress(self, progress_data):
+        """Write a progress snapshot; safe to call from a worker thread."""
+        try:
+            with self._progress_write_lock:
+                write_json_atomic(self.progress_file, progress_data)
+        except OSError as e:
+            logging.error(f"❌ Failed to save progress: {e}")
+
+    def _maybe_checkpoint(self):
+        """Save progress in a worker thread at most once per CHECKPOINT_INTERVAL_SECONDS."""
+        now = time.monotonic()
+        if now - self._last_checkpoint_at < CHECKPOINT_INTERVAL_SECONDS:
+            return
+        if self._checkpoint_task is not None and not self._checkpoint_task.done():
+            return  # previous checkpoint still being written
+        self._last_checkpoint_at = now
+        self._checkpoint_task = asyncio.create_task(
+            asyncio.to_thread(self.write_progress, self.progress_snapshot())
+        )
 
     def save_session(self, session):
         """Save session cookies for reuse."""
@@ -327,44 +558,98 @@ class PlusUltraFixedScraper:
                 'timestamp_amsterdam': get_amsterdam_time().strftime('%Y-%m-%d %H:%M:%S CET')
             }
 
-            with open(self.session_file, 'w') as f:
-                json.dump(session_data, f, indent=4)
+            write_json_atomic(self.session_file, session_data)
 
             self.session_cookies = cookies
             logging.info("💾 Saved session cookies")
 
-    def save_products(self, products):
-        """Save or update products with deduplication."""
+    async def save_products(self, products):
+        """Queue products for the NDJSON sidecar; callers pass products already deduplicated against scraped_products."""
         if not products:
             return
 
-        # Load existing products
-        existing_products = []
-        existing_ids = set()
-        if os.path.exists(self.products_file):
+        buf = b"".join(map(json_dumps_line, products))
+        if self._write_queue is not None:
+            await self._write_queue.put(buf)
+        else:
+            self.append_products(buf)
+        logger.info("💾 Saved %d new products (total: %d)", len(products), len(self.scraped_products))
+
+    def append_products(self, buf):
+        """Append serialized NDJSON lines to the sidecar; runs in a worker thread from the writer."""
+        if self._products_fd is None:
+            self._products_fd = os.open(self.products_ndjson, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.write(self._products_fd, buf)
+
+    async def _products_writer(self):
+        """Drain queued page buffers and append them off the event loop, one write per batch."""
+        while True:
+            batch = [await self._write_queue.get()]
+            while not self._write_queue.empty():
+                batch.append(self._write_queue.get_nowait())
             try:
-                with open(self.products_file, 'r') as f:
-                    existing_products = json.load(f)
-                    existing_ids = {p.get('product', {}).get('PLP_Str', {}).get('SKU') for p in existing_products if p.get('product', {}).get('PLP_Str', {}).get('SKU')}
-            except (json.JSONDecodeError, FileNotFoundError):
-                existing_products = []
-                existing_ids = set()
-
-        # Add new products
-        new_products = []
-        for product in products:
-            product_id = product.get('product', {}).get('PLP_Str', {}).get('SKU')
-            if product_id and product_id not in existing_ids:
-                new_products.append(product)
-                existing_ids.add(product_id)
+                await asyncio.to_thread(self.append_products, b"".join(batch))
+            except OSError as e:
+                logging.error(f"❌ Failed to append products to {self.products_ndjson}: {e}")
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
 
-        existing_products.extend(new_products)
+    def start_products_writer(self):
+        """Start the background NDJSON writer; must be called from the running loop."""
+        self._write_queue = asyncio.Queue(maxsize=PRODUCT_WRITE_QUEUE_SIZE)
+        self._writer_task = asyncio.create_task(self._products_writer())
 
-        with open(self.products_file, 'w') as f:
-            json.dump(existing_products, f, indent=4, ensure_ascii=False)
+    async def stop_products_writer(self):
+        """Wait for queued products to reach the sidecar, then stop the writer."""
+        if self._writer_task is None:
+            return
+        await self._write_queue.join()
+        self._writer_task.cancel()
+        try:
+            await self._writer_task
+        except asyncio.CancelledError:
+            pass
+        self._writer_task = None
+        self._write_queue = None
 
-        if new_products:
-            logging.info(f"💾 Saved {len(new_products)} new products (total: {len(existing_products)})") 
+    def write_completion_flag(self, completion_data):
+        """Write the completion flag; run in a worker thread at the end of run()."""
+        with open(self.completed_flag, 'wb') as f:
+            f.write(json_dumps_pretty(completion_data))
+
+    def close_products_file(self):
+        """Close the NDJSON append fd so the sidecar can be finalized."""
+        if self._products_fd is not None:
+            os.close(self._products_fd)
+            self._products_fd = None
+
+    def finalize_products_file(self):
+        """Aggregate the NDJSON sidecar into the products JSON array read by the API and webhook."""
+        if not os.path.exists(self.products_ndjson):
+            return 0
+
+        count = 0
+        tmp_file = f"{self.products_file}.tmp"
+        with open(self.products_ndjson, 'rb') as src, open(tmp_file, 'wb') as dst:
+            dst.write(b"[")
+            for line in src:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    json_loads(line)
+                except ValueError:
+                    logging.warning("⚠️ Skipping truncated line in products NDJSON")
+                    continue
+                dst.write(b",\n" if count else b"\n")
+                dst.write(line)
+                count += 1
+            dst.write(b"\n]\n")
+        os.replace(tmp_file, self.products_file)
+
+        logging.info(f"📦 Wrote {count} products to {self.products_file}")
+        return count
 
     async def refresh_authentication(self, session):
         """FIXED: Refresh authentication tokens periodically."""
@@ -394,6 +679,14 @@ class PlusUltraFixedScraper:
             logging.error(f"❌ Authentication refresh error: {e}")
             return False
 
+    async def refresh_authentication_once(self, session, stale_generation):
+        """Refresh the CSRF token once, even when several requests are rejected together."""
+        async with self.auth_lock:
+            if self.auth_refreshes != stale_generation:
+                return  # another coroutine refreshed since this request was sent
+            await self.refresh_authentication(session)
+            self.last_auth_refresh = self.requests_made
+
     async def establish_session(self, session):
         """Initialize session and extract authentication tokens."""
         try:
@@ -434,44 +727,24 @@ class PlusUltraFixedScraper:
 
     def extract_csrf_from_content(self, page_content, cookies):
         """Enhanced CSRF token extraction."""
-        import re
-        import urllib.parse
-        
-        # Try multiple extraction methods
-        csrf_patterns = [
-            # From cookies
-            (cookies, [
-                (r'crf%3d([^%\\s]+(?:%[0-9A-Fa-f]{2})*)', lambda m: urllib.parse.unquote(m.group(1))),
-                (r'crf=([^;\\s&]+)', lambda m: m.group(1))
-            ]),
-            # From page content
-            (page_content, [
-                (r'name=["\']csrf[_-]?token["\'][^>]*value=["\']([^"\']+)["\']', lambda m: m.group(1)),
-                (r'csrf[_-]?token["\']?\\s*[:=]\\s*["\']([^"\']+)["\']', lambda m: m.group(1)),
-                (r'"csrfToken"\\s*:\\s*"([^"]+)"', lambda m: m.group(1))
-            ])
-        ]
+        # From cookies
+        for cookie_value in cookies.values():
+            if 'crf' in cookie_value.lower():
+                for pattern, extractor in COOKIE_CSRF_PATTERNS:
+                    match = pattern.search(cookie_value)
+                    if match:
+                        try:
+                            token = extractor(match)
+                            if len(token) > 10:
+                                return token
+                        except:
+                            continue
         
-        for source, patterns in csrf_patterns:
-            if isinstance(source, dict):  # cookies
-                for cookie_name, cookie_value in source.items():
-                    if 'crf' in cookie_value.lower():
-                        for pattern, extractor in patterns:
-                            match = re.search(pattern, cookie_value, re.IGNORECASE)
-                            if match:
-                                try:
-                                    token = extractor(match)
-                                    if len(token) > 10:
-                                        return token
-                                except:
-                                    continue
-            else:  # page content
-                for pattern, extractor in patterns:
-                    matches = re.findall(pattern, source, re.IGNORECASE)
-                    if matches:
-                        token = matches[0] if isinstance(matches[0], str) else extractor(matches[0])
-                        if len(token) > 8:
-                            return token
+        # From page content
+        for pattern in PAGE_CSRF_PATTERNS:
+            match = pattern.search(page_content)
+            if match and len(match.group(1)) > 8:
+                return match.group(1)
         
         return None
 
@@ -483,14 +756,9 @@ class PlusUltraFixedScraper:
         return headers
 
     async def make_ultra_fixed_api_request(self, session, endpoint, payload=None):
-        """ULTRA-FIXED: API request with fixed intervals and auth management."""
-        # Check if auth refresh needed
-        if self.requests_made - self.last_auth_refresh >= AUTH_REFRESH_INTERVAL:
-            await self.refresh_authentication(session)
-            self.last_auth_refresh = self.requests_made
-
+        """ULTRA-FIXED: API request with fixed intervals and on-demand auth refresh."""
         url = f"{API_BASE_URL}{endpoint}"
-        headers = self.get_headers_with_auth()
+        body = json_dumps(payload or {})  # headers already carry the JSON Content-Type
         
         self.requests_made += 1
         
@@ -500,28 +768,38 @@ class PlusUltraFixedScraper:
                     # Minimal backoff - don't increase base delay
                     await asyncio.sleep(0.1 * attempt)
 
-                async with session.post(url, json=payload or {}, headers=headers) as response:
+                auth_generation = self.auth_refreshes
+                headers = self.get_headers_with_auth()
+                auth_rejected = False
+                async with session.post(url, data=body, headers=headers) as response:
                     if response.status == 200:
                         try:
-                            json_data = await response.json()
+                            json_data = json_loads(await response.read())
                             self.successful_requests += 1
                             return json_data
-                        except Exception:
-                            logging.error(f"❌ Invalid JSON from {endpoint}")
+                        except ValueError:
+                            logger.error("❌ Invalid JSON from %s", endpoint)
                             self.failed_requests += 1
                             return None
                     elif response.status == 429:
                         # Rate limited - DON'T increase base delay, just wait
-                        logging.warning(f"Rate limited on attempt {attempt + 1}, waiting...")
+                        logger.warning("Rate limited on attempt %d, waiting...", attempt + 1)
                         await asyncio.sleep(1)
                         continue
+                    elif response.status in AUTH_FAILURE_STATUSES:
+                        logger.warning("🔒 %s rejected the CSRF token (%s), refreshing...", endpoint, response.status)
+                        auth_rejected = True
                     else:
-                        logging.error(f"❌ API request failed {endpoint}: {response.status}")
+                        logger.error("❌ API request failed %s: %s", endpoint, response.status)
                         self.failed_requests += 1
                         return None
+
+                # Refresh outside the response context so the connection is released first
+                if auth_rejected:
+                    await self.refresh_authentication_once(session, auth_generation)
                         
             except Exception as e:
-                logging.warning(f"Request error on attempt {attempt + 1}: {e}")
+                logger.warning("Request error on attempt %d: %s", attempt + 1, e)
                 continue
 
         self.failed_requests += 1
@@ -573,54 +851,16 @@ class PlusUltraFixedScraper:
     async def get_products_ultra_fixed(self, session, category, page_number=1):
         """ULTRA-FIXED: Fetch products with PageSize=100."""
         try:
+            # Only the slug, page and checkout id vary; everything else comes from the shared template
             payload = {
-                "versionInfo": {
-                    "moduleVersion": WORKING_VERSIONS['moduleVersion'],
-                    "apiVersion": WORKING_VERSIONS['products_apiVersion']
-                },
+                "versionInfo": PRODUCT_LIST_VERSION_INFO,
                 "viewName": "MainFlow.ProductListPage",
                 "screenData": {
                     "variables": {
+                        **PRODUCT_LIST_VARIABLES,
                         "CategorySlug": category.get('slug', category.get('id', '')),
                         "PageNumber": page_number,
-                        "PageSize": OPTIMAL_PAGE_SIZE,  # FIXED at 100
-                        "AppliedFiltersList": {"List": []},
-                        "LocalCategoryID": 0,
-                        "LocalCategoryName": "",
-                        "LocalCategoryParentId": 0,
-                        "LocalCategoryTitle": "",
-                        "IsLoadingMore": False,
-                        "IsFirstDataFetched": False,
-                        "ShowFilters": False,
-                        "IsShowData": False,
-                        "StoreNumber": 0,
-                        "StoreChannel": "",
-                        "CheckoutId": f"ultra-fixed-{int(time.time())}",
-                        "IsOrderEditMode": False,
-                        "ProductList_All": {"List": []},
-                        "SelectedSort": "",
-                        "OrderEditId": "",
-                        "IsListRendered": False,
-                        "IsAlreadyFetch": False,
-                        "IsPromotionBannersFetched": False,
-                        "Period": {
-                            "FromDate": "2025-08-18",
-                            "ToDate": "2025-08-24"
-                        },
-                        "UserStoreId": "0",
-                        "FilterExpandedList": {"List": []},
-                        "ItemsInCart": {"List": []},
-                        "HideDummy": False,
-                        "OneWelcomeUserId": "",
-                        "SearchKeyword": "",
-                        "IsDesktop": False,
-                        "IsSearch": False,
-                        "URLPageNumber": 0,
-                        "FilterQueryURL": "",
-                        "IsMobile": True,
-                        "IsTablet": False,
-                        "Monitoring_FlowTypeId": 3,
-                        "IsCustomerUnderAge": False
+                        "CheckoutId": self._checkout_id_prefix + str(next(self._checkout_counter)),
                     }
                 }
             }
@@ -631,164 +871,210 @@ class PlusUltraFixedScraper:
                 raw_products = result.get("data", {}).get("ProductList", {}).get("List", [])
                 total_pages = result.get("data", {}).get("TotalPages", 1)
                 
-                products = []
-                for raw_product in raw_products:
-                    if raw_product:
-                        formatted_product = {
-                            "product": raw_product,
-                            "scraped_from_category": category.get('name', 'Unknown'),
-                            "scraped_at": get_amsterdam_time().isoformat(),
-                            "optimization_version": "ultra_fixed_v1",
-                            "page_number": page_number,
-                            "page_size_used": OPTIMAL_PAGE_SIZE,
-                            "test_mode": TEST_MODE
-                        }
-                        products.append(formatted_product)
+                # Per-page values are computed once; every product on the page shares them
+                category_name = category.get('name', 'Unknown')
+                scraped_at = get_amsterdam_time().isoformat()
+                products = [
+                    {
+                        "product": raw_product,
+                        "scraped_from_category": category_name,
+                        "scraped_at": scraped_at,
+                        "optimization_version": "ultra_fixed_v1",
+                        "page_number": page_number,
+                        "page_size_used": OPTIMAL_PAGE_SIZE,
+                        "test_mode": TEST_MODE
+                    }
+                    for raw_product in raw_products if raw_product
+                ]
                 
                 has_more = page_number < total_pages and len(raw_products) > 0
                 return products, has_more, total_pages
                 
         except Exception as e:
-            logging.error(f"❌ Error fetching products (page {page_number}): {e}")
+            logger.error("❌ Error fetching products (page %d): %s", page_number, e)
             
         return [], False, 1
 
-    async def scrape_category_ultra_fixed(self, session, category, semaphore):
-        """ULTRA-FIXED: Scrape category with maintained concurrency."""
-        async with semaphore:
-            category_name = category.get('name', 'Unknown Category')
-            category_id = category.get('id', '')
-            total_products = 0
-            
-            # Skip if already completed (unless TEST_MODE)
-            if category_id in self.completed_categories and not TEST_MODE:
-                logging.info(f"⏭️ Skipping completed category: {category_name}")
-                return 0
-            
-            # Resume from previous page if available
-            current_page = self.category_progress.get(category_id, 1)
-            
-            logging.info(f"🛒 ULTRA-FIXED {category_name} (starting page {current_page})")
+    def _limit_reached(self):
+        """True once the configured max_products limit has been hit."""
+        return self.max_products_limit is not None and self.total_scraped >= self.max_products_limit
+
+    def start_category(self, category, queue):
+        """Seed the page queue with a category's first (or resumed) page."""
+        category_id = category.get('id', '')
+        
+        # Resume from previous page if available
+        current_page = self.category_progress.get(category_id, 1)
+        logger.info("🛒 ULTRA-FIXED %s (starting page %d)", category.get('name', 'Unknown Category'), current_page)
+        
+        max_pages = TEST_PAGES_PER_CATEGORY if TEST_MODE else 200
+        crawl = CategoryCrawl(category, first_page=current_page, next_page=current_page, last_page=max_pages)
+        self.enqueue_pages(crawl, queue)
+        return crawl
+
+    def enqueue_pages(self, crawl, queue):
+        """Queue the category's next pages: one at a time until TotalPages is known, then all of them."""
+        if self.shutdown_requested or self._limit_reached() or crawl.consecutive_empty >= MAX_EMPTY_PAGES_PER_CATEGORY:
+            return
+        
+        count = crawl.last_page if crawl.total_known else 1
+        while count > 0 and crawl.next_page <= crawl.last_page:
+            queue.put_nowait((crawl, crawl.next_page))
+            crawl.next_page += 1
+            crawl.pending += 1
+            count -= 1
+
+    async def process_page(self, crawl, page_number, products, has_more, total_pages):
+        """Dedup and save one fetched page, then record progress for its category."""
+        category_name = crawl.category.get('name', 'Unknown Category')
+        category_id = crawl.category.get('id', '')
+        
+        if not products:
+            crawl.consecutive_empty += 1
+            # One re-probe absorbs a transient empty page; a second one the API also calls
+            # the last page ends the category before the MAX_EMPTY_PAGES_PER_CATEGORY cutoff
+            if not has_more and crawl.consecutive_empty >= 2:
+                crawl.last_page = min(crawl.last_page, page_number)
+            return
+        crawl.consecutive_empty = 0
+        
+        # Narrow the crawl to the pages the category actually has
+        crawl.total_known = True
+        crawl.last_page = min(crawl.last_page, total_pages if has_more else page_number)
+        
+        # Process products (lookups hoisted out of the per-product loop)
+        seen = self.scraped_products
+        seen_add = seen.add
+        max_limit = self.max_products_limit
+        new_products = []
+        for product in products:
+            try:
+                product_id = product['product']['PLP_Str']['SKU']
+            except (KeyError, TypeError):
+                continue
+            if not product_id or product_id in seen:
+                continue
+            seen_add(product_id)
+            new_products.append(product)
             
-            consecutive_empty_pages = 0
-            max_empty_pages = 3
-            max_pages = TEST_PAGES_PER_CATEGORY if TEST_MODE else 200
+            # Check if we've hit the product limit after each product
+            if max_limit is not None and self.total_scraped + len(new_products) >= max_limit:
+                break
+        crawl.total_products += len(new_products)
+        self.total_scraped += len(new_products)
+        
+        if new_products:
+            await self.save_products(new_products)
             
-            while consecutive_empty_pages < max_empty_pages and current_page <= max_pages and not self.shutdown_requested:
-                # Check product limit before each page
-                if hasattr(self, 'max_products_limit') and self.max_products_limit:
-                    if self.total_scraped >= self.max_products_limit:
-                        logging.info(f"🛑 Reached maximum products limit: {self.max_products_limit}")
-                        break
+            if logger.isEnabledFor(logging.INFO):
+                # Calculate current rate
+                elapsed = time.monotonic() - self.start_time
+                current_rate = self.total_scraped / elapsed if elapsed > 0 else 0
                 
-                try:
-                    products, has_more, total_pages = await self.get_products_ultra_fixed(session, category, current_page)
-                    
-                    if not products:
-                        consecutive_empty_pages += 1
-                        current_page += 1
-                        continue
-                    else:
-                        consecutive_empty_pages = 0
-                    
-                    # Process products
-                    new_products = []
-                    for product in products:
-                        product_id = product.get('product', {}).get('PLP_Str', {}).get('SKU')
-                        if product_id and product_id not in self.scraped_products:
-                            self.scraped_products.add(product_id)
-                            new_products.append(product)
-                            total_products += 1
-                            self.total_scraped += 1
-                            
-                            # Check if we've hit the product limit after each product
-                            if hasattr(self, 'max_products_limit') and self.max_products_limit:
-                                if self.total_scraped >= self.max_products_limit:
-                                    break
-                    
-                    if new_products:
-                        self.save_products(new_products)
-                        
-                        # Calculate current rate
-                        elapsed = time.time() - self.start_time
-                        current_rate = self.total_scraped / elapsed if elapsed > 0 else 0
-                        
-                        logging.info(f"⚡ {category_name} p{current_page}: +{len(new_products)} | Total: {self.total_scraped} @ {current_rate:.1f}/sec")
-                    
-                    # Check if we hit the limit and need to exit the page loop
-                    if hasattr(self, 'max_products_limit') and self.max_products_limit:
-                        if self.total_scraped >= self.max_products_limit:
-                            logging.info(f"🛑 Category {category_name} stopping - reached limit: {self.max_products_limit}")
-                            break
-                    
-                    # Update progress
-                    self.category_progress[category_id] = current_page
-                    
-                    # Global progress update
-                    progress_percent = min(100, (self.total_scraped / self.estimated_total_products) * 100)
-                    elapsed_time = time.time() - self.start_time
-                    overall_rate = self.total_scraped / elapsed_time if elapsed_time > 0 else 0
-                    req_rate = self.requests_made / elapsed_time * 60 if elapsed_time > 0 else 0
-                    
-                    update_progress('plus', 
-                                  progress_percent=progress_percent, 
-                                  products_scraped=self.total_scraped,
-                                  current_task=f"FIXED: {category_name} p{current_page} - {overall_rate:.1f}/sec ({req_rate:.0f}req/min)")
-                    
-                    # Save progress frequently
-                    if current_page % 2 == 0:
-                        self.save_progress()
-                    
-                    # Check continuation
-                    if not has_more:
-                        break
-                    
-                    current_page += 1
-                    
-                    # FIXED: Always use original delay - no modifications
-                    await asyncio.sleep(self.original_delay)
-                    
-                except Exception as e:
-                    logging.error(f"❌ Error processing {category_name} page {current_page}: {e}")
-                    consecutive_empty_pages += 1
-                    current_page += 1
-                    await asyncio.sleep(0.5)
-            
-            # Mark category as completed
-            self.completed_categories.add(category_id)
-            self.save_progress()
-            
-            elapsed = time.time() - self.start_time
-            current_rate = self.total_scraped / elapsed if elapsed > 0 else 0
-            logging.info(f"✅ ULTRA-FIXED-COMPLETED {category_name}: {total_products} products | Overall: {current_rate:.1f}/sec")
-            
-            return total_products
+                logger.info("⚡ %s p%d: +%d | Total: %d @ %.1f/sec",
+                            category_name, page_number, len(new_products), self.total_scraped, current_rate)
+        
+        # Resume point: highest page with every earlier page done
+        crawl.done_pages.add(page_number)
+        resume_page = self.category_progress.get(category_id, crawl.first_page - 1)
+        while resume_page + 1 in crawl.done_pages:
+            resume_page += 1
+        if resume_page >= crawl.first_page:
+            self.category_progress[category_id] = resume_page
+        
+        # Global progress update (throttled; pages finish many times per second across workers)
+        self._last_page = (category_name, page_number)
+        now = time.monotonic()
+        if now - self._last_progress_push >= PROGRESS_UPDATE_INTERVAL_SECONDS:
+            self._last_progress_push = now
+            self.push_progress(category_name, page_number)
+        
+        # Save progress frequently (debounced)
+        self._maybe_checkpoint()
 
-    async def run(self):
-        """ULTRA-FIXED: Main scraping method with all fixes applied."""
-        if self.scraping_completed and not TEST_MODE:
-            update_status('plus', ScraperStatus.COMPLETED, f"Already completed with {self.total_scraped} products")
-            return
+    def push_progress(self, category_name, page_number):
+        """Report overall progress to the monitor."""
+        progress_percent = min(100, (self.total_scraped / self.estimated_total_products) * 100)
+        elapsed_time = time.monotonic() - self.start_time
+        overall_rate = self.total_scraped / elapsed_time if elapsed_time > 0 else 0
+        req_rate = self.requests_made / elapsed_time * 60 if elapsed_time > 0 else 0
         
-        mode_str = "TEST MODE" if TEST_MODE else "FULL CATALOG"
-        update_status('plus', ScraperStatus.STARTING, f"Initializing Plus Ultra-Fixed Scraper - {mode_str}")
+        update_progress('plus', 
+                      progress_percent=progress_percent, 
+                      products_scraped=self.total_scraped,
+                      current_task=f"FIXED: {category_name} p{page_number} - {overall_rate:.1f}/sec ({req_rate:.0f}req/min)")
+
+    def finish_category(self, crawl):
+        """Mark a category completed once none of its pages are queued or in flight."""
+        category_name = crawl.category.get('name', 'Unknown Category')
+        if self._limit_reached():
+            logger.info("🛑 Category %s stopping - reached limit: %d", category_name, self.max_products_limit)
         
-        scraping_start_time = time.time()
+        # Mark category as completed
+        self.completed_categories.add(crawl.category.get('id', ''))
+        self._maybe_checkpoint()
         
+        elapsed = time.monotonic() - self.start_time
+        current_rate = self.total_scraped / elapsed if elapsed > 0 else 0
+        logger.info("✅ ULTRA-FIXED-COMPLETED %s: %d products | Overall: %.1f/sec", category_name, crawl.total_products, current_rate)
+
+    async def page_worker(self, session, queue):
+        """ULTRA-FIXED: Fetch (category, page) items from the shared queue until cancelled."""
+        while True:
+            crawl, page_number = await queue.get()
+            try:
+                # Pages queued before a limit or shutdown are drained without a request
+                if not self.shutdown_requested and not self._limit_reached():
+                    # FIXED: Always use original delay between requests - no modifications
+                    await asyncio.sleep(self.original_delay)
+                    result = await self.get_products_ultra_fixed(session, crawl.category, page_number)
+                    await self.process_page(crawl, page_number, *result)
+            except Exception as e:
+                logger.error("❌ Error processing %s page %d: %s", crawl.category.get('name', 'Unknown Category'), page_number, e)
+                crawl.consecutive_empty += 1
+            finally:
+                self.enqueue_pages(crawl, queue)
+                crawl.pending -= 1
+                if crawl.pending == 0:
+                    self.finish_category(crawl)
+                queue.task_done()
+
+    def _build_session(self):
+        """Create the single ClientSession shared by every page worker."""
         # ULTRA-FIXED: Aggressive connection settings with proper limits
         connector = aiohttp.TCPConnector(
             limit=HIGH_SEMAPHORE_LIMIT * 2,  # Higher connection pool
             limit_per_host=HIGH_SEMAPHORE_LIMIT,
-            ttl_dns_cache=300,
+            ttl_dns_cache=600,
             use_dns_cache=True,
-            keepalive_timeout=30
+            force_close=False,
+            keepalive_timeout=75,  # outlive idle gaps so pooled TLS connections are reused
+            enable_cleanup_closed=True,  # reclaim sockets left half-closed by the server
+            resolver=aiohttp.AsyncResolver() if aiodns else None
         )
         
-        async with aiohttp.ClientSession(
+        return aiohttp.ClientSession(
             timeout=self.timeout_config,
             connector=connector,
-            cookies=self.session_cookies
-        ) as session:
+            cookies=self.session_cookies,
+            trust_env=False,  # no proxy/netrc lookups from the environment
+            skip_auto_headers=('User-Agent',)  # every request sends ULTRA_HEADERS' User-Agent
+        )
+
+    async def run(self):
+        """ULTRA-FIXED: Main scraping method with all fixes applied."""
+        if self.scraping_completed and not TEST_MODE:
+            update_status('plus', ScraperStatus.COMPLETED, f"Already completed with {self.total_scraped} products")
+            return
+        
+        mode_str = "TEST MODE" if TEST_MODE else "FULL CATALOG"
+        update_status('plus', ScraperStatus.STARTING, f"Initializing Plus Ultra-Fixed Scraper - {mode_str}")
+        
+        scraping_start_time = time.monotonic()
+        
+        self.auth_lock = asyncio.Lock()
+        self.start_products_writer()
+        async with self._build_session() as session:
             
             try:
                 self.save_session(session)
@@ -809,40 +1095,41 @@ class PlusUltraFixedScraper:
                 logging.info(f"   Mode: {mode_str}")
                 logging.info(f"   Target performance: 200+ products/sec")
                 logging.info(f"   Fixed PageSize: {OPTIMAL_PAGE_SIZE} (36.0 products/sec per request)")
-                logging.info(f"   Fixed concurrency: {MAX_CONCURRENT_CATEGORIES}")
-                logging.info(f"   Fixed semaphore: {HIGH_SEMAPHORE_LIMIT}")
+                logging.info(f"   Fixed page workers: {HIGH_SEMAPHORE_LIMIT}")
                 logging.info(f"   Fixed interval: {self.original_delay}s")
                 
                 update_status('plus', ScraperStatus.RUNNING, 
                              f"ULTRA-FIXED: {len(categories)} categories @ 200+ products/sec - {mode_str}")
                 
-                # ULTRA-FIXED: High concurrency with proper semaphore
-                semaphore = asyncio.Semaphore(HIGH_SEMAPHORE_LIMIT)
+                # ULTRA-FIXED: One shared (category, page) queue drained by HIGH_SEMAPHORE_LIMIT workers
+                page_queue = asyncio.Queue()
+                
+                pending_categories = [category for category in categories
+                                      if TEST_MODE or category.get('id') not in self.completed_categories]
                 
-                category_tasks = []
-                for category in categories:
-                    if not self.shutdown_requested:
-                        # Check if we've hit the product limit
-                        if hasattr(self, 'max_products_limit') and self.max_products_limit:
-                            if self.total_scraped >= self.max_products_limit:
-                                logging.info(f"🛑 Reached maximum products limit: {self.max_products_limit}")
-                                break
-                                
-                        if TEST_MODE or category.get('id') not in self.completed_categories:
-                            task = asyncio.create_task(
-                                self.scrape_category_ultra_fixed(session, category, semaphore)
-                            )
-                            category_tasks.append(task)
+                # A resumed run may already be at the product limit
+                if self._limit_reached():
+                    logging.info(f"🛑 Reached maximum products limit: {self.max_products_limit}")
+                    pending_categories = []
                 
-                logging.info(f"🚀 ULTRA-FIXED: Starting {len(category_tasks)} concurrent categories...")
+                crawls = [self.start_category(category, page_queue) for category in pending_categories]
                 
-                # Process all categories with maintained concurrency
-                category_results = await asyncio.gather(*category_tasks, return_exceptions=True)
+                logging.info(f"🚀 ULTRA-FIXED: Starting {len(crawls)} categories on {HIGH_SEMAPHORE_LIMIT} page workers...")
                 
-                total_new_products = sum(result for result in category_results if isinstance(result, int))
+                # A worker dying unexpectedly cancels its siblings and surfaces here instead of
+                # leaving page_queue.join() waiting on items that will never be marked done
+                async with asyncio.TaskGroup() as workers:
+                    worker_tasks = [workers.create_task(self.page_worker(session, page_queue))
+                                    for _ in range(HIGH_SEMAPHORE_LIMIT)]
+                    await page_queue.join()
+                    for worker in worker_tasks:
+                        worker.cancel()
+                
+                # The throttle may have skipped the last pages; always report the final counts
+                await asyncio.to_thread(self.push_progress, *self._last_page)
                 
                 # Final performance report
-                total_duration = time.time() - scraping_start_time
+                total_duration = time.monotonic() - scraping_start_time
                 final_rate = self.total_scraped / total_duration if total_duration > 0 else 0
                 req_rate = self.requests_made / total_duration * 60 if total_duration > 0 else 0
                 
@@ -855,7 +1142,7 @@ class PlusUltraFixedScraper:
                 logging.info(f"   Total requests: {self.requests_made}")
                 logging.info(f"   Success rate: {self.successful_requests}/{self.requests_made} ({self.successful_requests/max(1,self.requests_made)*100:.1f}%)")
                 logging.info(f"   Auth refreshes: {self.auth_refreshes}")
-                logging.info(f"   Categories processed: {len(category_results)}")
+                logging.info(f"   Categories processed: {len(crawls)}")
                 logging.info(f"   Fixed interval maintained: {self.original_delay}s")
                 
                 # Calculate improvements
@@ -869,26 +1156,25 @@ class PlusUltraFixedScraper:
                 
                 # Mark completion (only in full mode)
                 if not TEST_MODE:
-                    with open(self.completed_flag, 'w') as f:
-                        completion_data = {
-                            'completed_at': get_amsterdam_time().isoformat(),
-                            'total_products': self.total_scraped,
-                            'duration_seconds': total_duration,
-                            'products_per_second': final_rate,
-                            'requests_per_minute': req_rate,
-                            'optimization_version': 'ultra_fixed_v1',
-                            'page_size_used': OPTIMAL_PAGE_SIZE,
-                            'fixed_interval': self.original_delay,
-                            'high_semaphore': HIGH_SEMAPHORE_LIMIT,
-                            'concurrent_categories': MAX_CONCURRENT_CATEGORIES,
-                            'total_requests': self.requests_made,
-                            'success_rate': self.successful_requests / max(1, self.requests_made),
-                            'auth_refreshes': self.auth_refreshes,
-                            'improvement_vs_original': improvement_vs_original,
-                            'improvement_vs_previous_ultra': improvement_vs_previous,
-                            'all_fixes_applied': True
-                        }
-                        json.dump(completion_data, f, indent=4)
+                    completion_data = {
+                        'completed_at': get_amsterdam_time().isoformat(),
+                        'total_products': self.total_scraped,
+                        'duration_seconds': total_duration,
+                        'products_per_second': final_rate,
+                        'requests_per_minute': req_rate,
+                        'optimization_version': 'ultra_fixed_v1',
+                        'page_size_used': OPTIMAL_PAGE_SIZE,
+                        'fixed_interval': self.original_delay,
+                        'high_semaphore': HIGH_SEMAPHORE_LIMIT,
+                        'concurrent_categories': MAX_CONCURRENT_CATEGORIES,
+                        'total_requests': self.requests_made,
+                        'success_rate': self.successful_requests / max(1, self.requests_made),
+                        'auth_refreshes': self.auth_refreshes,
+                        'improvement_vs_original': improvement_vs_original,
+                        'improvement_vs_previous_ultra': improvement_vs_previous,
+                        'all_fixes_applied': True
+                    }
+                    await asyncio.to_thread(self.write_completion_flag, completion_data)
                 
                 status_msg = f"ULTRA-FIXED: {self.total_scraped} products @ {final_rate:.1f}/sec ({improvement_vs_previous:.1f}x improvement)"
                 update_status('plus', ScraperStatus.COMPLETED, status_msg)
@@ -898,7 +1184,15 @@ class PlusUltraFixedScraper:
                 update_status('plus', ScraperStatus.FAILED, f"Error: {str(e)}")
                 raise
             finally:
-                self.save_progress()
+                if self._checkpoint_task is not None:
+                    await self._checkpoint_task
+                await self.stop_products_writer()  # queued pages reach the sidecar before the final checkpoint
+                await asyncio.to_thread(self.save_progress)
+                try:
+                    self.close_products_file()
+                    await asyncio.to_thread(self.finalize_products_file)
+                except Exception as e:
+                    logging.error(f"❌ Failed to write products file {self.products_file}: {e}")
 
 async def main():
     """Main function to run the ultra-fixed Plus scraper."""
@@ -924,5 +1218,15 @@ async def main():
     
     logging.info("✅ Ultra-fixed scraper execution completed")
 
+def run_event_loop(coro):
+    """Run coro on uvloop when installed, otherwise on the default asyncio loop.
+
+    Loop debug mode stays off even if PYTHONASYNCIODEBUG is set in the container,
+    since its per-callback timing checks are too costly at the scraper's request rate.
+    """
+    if uvloop is not None:
+        return uvloop.run(coro, debug=False)
+    return asyncio.run(coro, debug=False)
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run_event_loop(main())
\ No newline at end of file